@@ -1,8 +1,544 @@
 import os
-from requests import get
+import re
+import glob
+import json
+import time
+import atexit
+import shutil
+import hashlib
+import threading
+from contextlib import contextmanager
+from requests import get, Session
+from requests.adapters import HTTPAdapter
 from urllib.parse import urlparse
+from email.utils import formatdate
+from concurrent.futures import ThreadPoolExecutor
 
-def cache_data(src:str, dest:str) -> str:
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+    import msvcrt
+
+# Download in 1MB pieces so that memory use stays flat
+# no matter how large the remote file turns out to be.
+CHUNK_SIZE = 1024**2
+
+# Everything we download lives in one shared store so that each
+# data set is only downloaded once per machine, no matter which 
+# helper function or working directory asked for it. You can move
+# the store (e.g. to a larger disk) by setting FSDS_CACHE_DIR and
+# change the maximum size (in bytes, including Parquet sidecars) 
+# with FSDS_CACHE_LIMIT.
+CACHE_DIR   = os.environ.get('FSDS_CACHE_DIR', 
+                             os.path.join(os.path.expanduser('~'), '.cache', 'fsds'))
+CACHE_LIMIT = int(os.environ.get('FSDS_CACHE_LIMIT', 10 * 1024**3))
+
+# Name of the manifest that records what we know about
+# every file downloaded into the store.
+MANIFEST = '.cache.json'
+
+# Manifests that have already been read from disk, keyed
+# on the store directory. Once loaded, checking for a 
+# cache hit is just a dictionary lookup. The lock lets 
+# several downloads update a manifest at once.
+_manifests = {}
+_lock = threading.RLock()
+
+@contextmanager
+def _file_lock(path:str):
+    """Holds an exclusive lock on a file (creating it if necessary).
+    
+    The store is shared by every process on the machine (e.g. several
+    Jupyter kernels) so this is what stops two of them updating the 
+    manifest, or downloading the same file, at the same time. The 
+    operating system releases the lock if the process dies.
+    
+    Lock files are deleted when their file is evicted (see 
+    `_remove_lock`), so once we have the lock we check that the file
+    is still there: if it isn't, whoever comes next would lock a new
+    file of the same name and we start again.
+    """
+    while True:
+        f = open(path, 'a+b')
+        if fcntl is None:
+            break
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            if os.path.samestat(os.fstat(f.fileno()), os.stat(path)):
+                break
+        except FileNotFoundError:
+            pass
+        f.close()
+    
+    with f:
+        if fcntl is None:
+            # msvcrt only retries for 10 seconds so we keep trying
+            while True:
+                try:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    pass
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+def _remove_lock(path:str) -> None:
+    """Deletes a lock file made by `_file_lock` unless it is in use.
+    
+    This is called when a file is evicted so that its lock doesn't
+    stay in the store for ever. We only try to take the lock (rather
+    than wait for it) since whoever holds it may be waiting for the
+    manifest, which the caller holds: they can tidy up after themselves.
+    Windows won't delete a file that anyone has open, which does the 
+    same job.
+    """
+    if fcntl is None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return
+    try:
+        fd = os.open(path, os.O_RDWR)
+    except FileNotFoundError:
+        return
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        os.remove(path)
+    except (BlockingIOError, FileNotFoundError):
+        pass
+    finally:
+        os.close(fd)
+
+def _load_manifest(root:str) -> dict:
+    """Returns the (in-memory) manifest for a store directory."""
+    with _lock:
+        if root not in _manifests:
+            _manifests[root] = _read_manifest(root)
+        return _manifests[root]
+
+def _read_manifest(root:str) -> dict:
+    """Reads the manifest for a store directory from disk."""
+    try:
+        with open(os.path.join(root, MANIFEST), 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def _merge(disk:dict, ours:dict) -> dict:
+    """Adds what this process knows to the manifest read from disk.
+    
+    Other processes may have downloaded (or evicted) files since we
+    last read the manifest, so the copy on disk decides which files
+    are in the store. All that we add is the access times (and local
+    copies, see `cache_file`) from our own cache hits, and only for 
+    entries that are still the same download.
+    """
+    for src, e in disk.items():
+        mine = ours.get(src)
+        if mine is not None and mine.get('sha256') == e.get('sha256'):
+            e['accessed'] = max(e.get('accessed', 0), mine.get('accessed', 0))
+            if mine.get('copies'):
+                e['copies'] = {**e.get('copies', {}), **mine['copies']}
+    return disk
+
+@contextmanager
+def _update_manifest(root:str):
+    """Re-reads, updates and saves the manifest for a store directory.
+    
+    While the file lock is held the manifest on disk is re-read and 
+    merged with ours (see `_merge`), the caller can then change it, and
+    it is written back before anyone else can touch it.
+    """
+    os.makedirs(root, exist_ok=True)
+    mfn = os.path.join(root, MANIFEST)
+    with _lock, _file_lock(mfn + '.lock'):
+        manifest = _merge(_read_manifest(root), _manifests.get(root, {}))
+        yield manifest
+        with open(mfn + '.tmp', 'w') as f:
+            json.dump(manifest, f, indent=1)
+        os.replace(mfn + '.tmp', mfn)
+        _manifests[root] = manifest
+
+def _save_manifest(root:str) -> None:
+    """Writes the manifest for a store directory back to disk."""
+    with _update_manifest(root):
+        pass
+
+# Cache hits only update the access time in memory (so that a
+# hit never has to write to disk); this makes sure that they are
+# remembered for the next session's LRU eviction.
+@atexit.register
+def _save_manifests() -> None:
+    for root in list(_manifests):
+        if os.path.isdir(root):
+            _save_manifest(root)
+
+def _part_info(part:str) -> dict:
+    """Reads what was recorded about a '.part' file when it was started."""
+    try:
+        with open(part + '.json', 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def _content_range(response) -> tuple:
+    """Returns the first byte and total size from a Content-Range header.
+    
+    Either (or both) can be None if the server didn't say, e.g. 
+    'bytes */1234' (sent with a 416) has no first byte.
+    """
+    m = re.match(r'bytes (?:(\d+)-\d+|\*)/(\d+|\*)', response.headers.get('Content-Range', ''))
+    if m is None:
+        return None, None
+    start, total = m.groups()
+    return (int(start) if start else None), (int(total) if total != '*' else None)
+
+def _download(src:str, dfn:str, chunk_size:int=CHUNK_SIZE, headers:dict=None, session:Session=None) -> dict:
+    """Streams a remote file to disk, resuming where possible.
+    
+    The data is written to a '.part' file alongside the destination
+    so that a dropped connection never leaves a truncated file where
+    the real one should be. If a '.part' file already exists then we
+    ask the server for the rest of the file using an HTTP Range header
+    and, once everything has arrived, the '.part' file is renamed in a
+    single (atomic) step.
+    
+    A download is only resumed if the server can promise that the file
+    hasn't changed since the '.part' file was started: the ETag (or 
+    Last-Modified date) from the first response is kept alongside the 
+    '.part' file and sent back as If-Range, and the Content-Range of the
+    reply has to start where we left off and give the same total size. 
+    If anything doesn't match then we throw away the '.part' file and 
+    start again from the beginning.
+    
+    Parameters
+    ----------
+    src : str
+        The remote *source* for the file.
+    dfn : str
+        The *destination filename* for the completed download.
+    chunk_size : int
+        The number of bytes to read from the network at a time.
+    headers : dict
+        Any additional request headers (e.g. for revalidation).
+    session : requests.Session
+        An optional session so that connections can be re-used.
+        
+    Returns
+    -------
+    dict
+        A manifest entry recording the url, ETag, Last-Modified, size
+        and SHA-256 checksum of the file, or None if the server says 
+        that our copy has not been modified (304).
+    """
+    part = dfn + '.part'
+    info = _part_info(part)
+    done = os.path.getsize(part) if os.path.isfile(part) else 0
+    sha  = hashlib.sha256()
+    
+    # If-Range needs a strong validator: an ETag that isn't weak ('W/...')
+    # or failing that a date. Without one we can't safely resume at all.
+    etag      = info.get('etag')
+    validator = etag if etag and not etag.startswith('W/') else info.get('last_modified')
+    if validator is None:
+        done = 0
+    
+    extra   = headers
+    headers = dict(headers or {})
+    # Byte ranges refer to what is sent over the wire, so we don't
+    # want the server compressing the file as it goes.
+    headers['Accept-Encoding'] = 'identity'
+    if done > 0:
+        headers['Range']    = f'bytes={done}-'
+        headers['If-Range'] = validator
+    fetch = session.get if session is not None else get
+    with fetch(src, headers=headers, stream=True, timeout=60) as response:
+        
+        if response.status_code == 304:
+            return None
+        
+        # A 206 means that the server honoured the Range header and
+        # we can append; a 416 means that it has nothing left to send
+        # so the '.part' file should already hold the whole thing. 
+        # Either way we check that the server is talking about the
+        # same file that we started with. Anything else (usually 200)
+        # means that we are getting the whole file again.
+        start, total = _content_range(response)
+        same = (info.get('size') in (None, total) and 
+                (etag is None or response.headers.get('ETag', etag) == etag))
+        if response.status_code == 206 and same and start == done and total is not None:
+            print(f"\tResuming from {done/1024**2:,.1f} MB...")
+            mode = 'ab'
+        elif response.status_code == 416 and same and total == done:
+            mode = None
+        elif response.status_code in (206, 416):
+            print(f"\tCan't resume the partial download, starting again...")
+            response.close()
+            for fn in [part, part + '.json']:
+                if os.path.exists(fn):
+                    os.remove(fn)
+            return _download(src, dfn, chunk_size, extra, session)
+        else:
+            response.raise_for_status()
+            mode, done = 'wb', 0
+            size  = response.headers.get('Content-Length')
+            total = int(size) if size is not None else None
+            with open(part + '.json', 'w') as f:
+                json.dump({'etag':          response.headers.get('ETag'),
+                           'last_modified': response.headers.get('Last-Modified'),
+                           'size':          total}, f)
+        
+        # The checksum has to cover whatever we already have
+        # on disk as well as whatever we're about to append.
+        if mode != 'wb' and done > 0:
+            with open(part, 'rb') as file:
+                for chunk in iter(lambda: file.read(chunk_size), b''):
+                    sha.update(chunk)
+        
+        if mode is not None:
+            with open(part, mode) as file:
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    file.write(chunk)
+                    sha.update(chunk)
+                    done += len(chunk)
+        
+        # A connection that closes early can look like the end of the
+        # file, so we leave the '.part' file to be resumed next time.
+        if total is not None and done != total:
+            raise IOError(f"Download of {src} stopped after {done:,} of {total:,} bytes")
+        
+        entry = {
+            'url':           src,
+            'file':          os.path.basename(dfn),
+            'etag':          response.headers.get('ETag', etag),
+            'last_modified': response.headers.get('Last-Modified', info.get('last_modified')),
+            'size':          done,
+            'sha256':        sha.hexdigest(),
+        }
+    
+    # Only now does the file appear under its real name
+    os.replace(part, dfn)
+    if os.path.exists(part + '.json'):
+        os.remove(part + '.json')
+    return entry
+
+def _evict(root:str, manifest:dict, keep:str, limit:int=None) -> None:
+    """Removes the least-recently-used files from the store.
+    
+    Files are deleted, oldest access first, until the store is
+    back under the size limit. Parquet sidecars (see `read_cached`) 
+    count towards the limit and go with the file they belong to. The 
+    file that has just been requested (`keep`) is never evicted. This
+    has to be called from inside `_update_manifest`.
+    
+    Note that files linked into a destination directory (see 
+    `materialise`) share their data with the copy in the store, so
+    evicting them only frees up disk space once those links have been
+    deleted too. The limit applies to the store, not to the disk.
+    """
+    limit = CACHE_LIMIT if limit is None else limit
+    
+    def files(e:dict) -> list:
+        sidecars = glob.glob(os.path.join(glob.escape(root), glob.escape(e['file']) + '.*parquet'))
+        return [e['file']] + [os.path.basename(fn) for fn in sidecars]
+    
+    def size(fns:list) -> int:
+        total = 0
+        for fn in fns:
+            try:
+                total += os.stat(os.path.join(root, fn)).st_size
+            except FileNotFoundError:
+                pass
+        return total
+    
+    sizes = {src: e['size'] + size(files(e)[1:]) for src, e in manifest.items()}
+    total = sum(sizes.values())
+    for src, e in sorted(manifest.items(), key=lambda i: i[1].get('accessed', 0)):
+        if total <= limit:
+            break
+        if src == keep:
+            continue
+        print(f"\tEvicting {e['file']} from the cache ({sizes[src]/1024**2:,.0f} MB)")
+        # Take any Parquet sidecars (see `read_cached`) with it
+        for fn in files(e):
+            try:
+                if os.stat(os.path.join(root, fn)).st_nlink > 1:
+                    print(f"\t\t{fn} is still linked elsewhere so no space is freed until that copy is deleted")
+                os.remove(os.path.join(root, fn))
+            except FileNotFoundError:
+                pass
+        _remove_lock(os.path.join(root, e['file']) + '.lock')
+        total -= sizes[src]
+        del manifest[src]
+
+def _store_path(root:str, src:str) -> str:
+    """Where a remote file is kept in the store.
+    
+    Files are stored under a hash of the full URL so that two 
+    sources with the same filename can't overwrite one another.
+    """
+    fn = os.path.split(urlparse(src).path)[-1] # Extract the filename
+    return os.path.join(root, hashlib.sha1(src.encode('utf-8')).hexdigest()[:16] + '-' + fn)
+
+def _is_fresh(sfn:str, entry:dict) -> bool:
+    """Whether a file in the store is still the one the manifest describes."""
+    try:
+        return entry is not None and os.stat(sfn).st_size == entry['size']
+    except FileNotFoundError:
+        return False
+
+def fetch(src:str, chunk_size:int=CHUNK_SIZE, revalidate:bool=False, session:Session=None, 
+          legacy:str=None, label:str=None) -> str:
+    """Returns the location of a remote file in the shared store.
+    
+    This is the cache 'engine' that sits behind both `cache_data` and
+    `dtools.get_url`. Files are streamed into the store (see `_download`)
+    and recorded in the store's manifest together with their size,
+    checksum, and the server's ETag/Last-Modified headers. A file is only
+    served from the store if the manifest says that it was downloaded 
+    completely and it is still the size that the manifest records. When
+    the store grows beyond `CACHE_LIMIT` the least-recently-used files
+    are removed (see `_evict`). The store can be shared by several 
+    processes at once: downloads and changes to the manifest are 
+    protected by file locks.
+    
+    Parameters
+    ----------
+    src : str
+        The remote *source* for the file, any valid URL should work.
+    chunk_size : int
+        The number of bytes to stream to disk at a time (default 1MB).
+    revalidate : bool
+        Ask the server whether the cached copy is still current (using
+        If-None-Match/If-Modified-Since) and download it again if not.
+    session : requests.Session
+        An optional session so that connections can be re-used.
+    legacy : str
+        An existing local copy (e.g. from before there was a store) 
+        that can be treated as a partial download and resumed, but 
+        only if its modification time matches the server's 
+        Last-Modified header (as it does for files fetched by wget).
+    label : str
+        How to refer to the file in progress messages (defaults to the
+        filename from the URL).
+        
+    Returns
+    -------
+    str
+        A string representing the location of the file in the store.
+    """
+    root  = CACHE_DIR
+    entry = _load_manifest(root).get(src)
+    sfn   = _store_path(root, src)
+    label = label or os.path.split(urlparse(src).path)[-1]
+    
+    # A cache hit is a file that the manifest knows about and
+    # that is still the size it was when we finished downloading
+    # it -- we don't need the network or to re-hash anything.
+    if _is_fresh(sfn, entry) and not revalidate:
+        print(f"Found {label} in the cache!")
+        entry['accessed'] = time.time()
+        return sfn
+    
+    # Only one process (or thread) at a time can download a file
+    os.makedirs(root, exist_ok=True)
+    with _file_lock(sfn + '.lock'):
+        
+        # ...so this one may have arrived while we were waiting
+        entry = _read_manifest(root).get(src)
+        fresh = _is_fresh(sfn, entry)
+        if fresh and not revalidate:
+            print(f"Found {label} in the cache!")
+            entry['accessed'] = time.time()
+            with _lock:
+                _load_manifest(root)[src] = entry
+            return sfn
+        
+        headers = {}
+        if fresh:
+            # Ask the server to tell us if anything has changed
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        else:
+            print(f"{label} not found, downloading!")
+            
+            # A local copy that the store doesn't know about may be a
+            # partial (or complete) download from before we kept a store.
+            # We can only trust it if the server can vouch for it: tools
+            # like wget (and `curl -R`) give the file the server's 
+            # Last-Modified date, so we send that as If-Range and the 
+            # server only sends the rest if the date is still current. 
+            # Otherwise we get the whole file again.
+            if legacy is not None and os.path.isfile(legacy) and not os.path.isfile(sfn + '.part'):
+                shutil.copyfile(legacy, sfn + '.part')
+                with open(sfn + '.part.json', 'w') as f:
+                    json.dump({'last_modified': formatdate(os.stat(legacy).st_mtime, usegmt=True)}, f)
+        
+        # Download and write the file a chunk at a time
+        update = _download(src, sfn, chunk_size, headers, session)
+        
+        with _update_manifest(root) as manifest:
+            if update is None:
+                print(f"Found {label} locally (unchanged on server)!")
+                if src in manifest:
+                    manifest[src]['accessed'] = time.time()
+            else:
+                update['accessed'] = time.time()
+                manifest[src] = update
+                
+                print("\tDone downloading...")
+                f_size = update['size']
+                print(f"\tSize is {f_size/1024**2:,.0f} MB ({f_size:,} bytes)")
+                
+                _evict(root, manifest, keep=src)
+    
+    return sfn
+
+def materialise(sfn:str, dfn:str) -> str:
+    """Makes a file from the store available at `dfn`.
+    
+    Wherever possible this is a hard link, so the data exists only
+    once on disk; if that isn't possible (e.g. the store is on a
+    different drive) then we fall back to copying the file.
+    """
+    try:
+        if os.path.samefile(sfn, dfn):
+            return dfn
+    except FileNotFoundError:
+        pass
+    
+    # Create any missing directories in dest(ination) path
+    # -- os.makedirs creates missing directories in a path 
+    # automatically.
+    path = os.path.dirname(dfn)
+    if path != '':
+        os.makedirs(path, exist_ok=True)
+    
+    # Link (or copy) alongside the destination and then rename
+    # so that nobody ever sees a half-copied file. The temporary
+    # name is unique so that two threads can't trip over it.
+    tmp = f"{dfn}.{os.getpid()}-{threading.get_ident()}.tmp"
+    if os.path.lexists(tmp):
+        os.remove(tmp)
+    try:
+        os.link(sfn, tmp)
+    except OSError:
+        shutil.copyfile(sfn, tmp)
+    os.replace(tmp, dfn)
+    return dfn
+
+def cache_data(src:str, dest:str, chunk_size:int=CHUNK_SIZE, revalidate:bool=False, session:Session=None) -> str:
     """Downloads and caches a remote file locally.
     
     The function sits between the 'read' step of a pandas or geopandas
@@ -11,12 +547,24 @@ def cache_data(src:str, dest:str) -> str:
     do so yourself. Subsequent re-reads of the file will return instantly
     rather than downloading the entire file for a second or n-th itme.
     
+    The file itself is downloaded into a shared store (see `fetch`) and
+    then linked into the destination directory, so asking for the same
+    file in a different directory doesn't download it a second time.
+    
     Parameters
     ----------
     src : str
         The remote *source* for the file, any valid URL should work.
     dest : str
         The *destination* location to save the downloaded file.
+    chunk_size : int
+        The number of bytes to stream to disk at a time (default 1MB).
+    revalidate : bool
+        Ask the server whether the cached copy is still current (using
+        If-None-Match/If-Modified-Since) and download it again if not.
+    session : requests.Session
+        An optional session so that connections can be re-used (see
+        `cache_many`).
         
     Returns
     -------
@@ -26,45 +574,282 @@ def cache_data(src:str, dest:str) -> str:
     
     url = urlparse(src) # We assume that this is some kind of valid URL 
     fn  = os.path.split(url.path)[-1] # Extract the filename
-    dfn = os.path.join(dest,fn) # Destination filename
-    
-    # Check if dest+filename does *not* exist -- 
-    # that would mean we have to download it! We
-    # also check for *very* small files that are 
-    # likely to represent an incomplete download.
-    if not os.path.isfile(dfn) or os.stat(dfn).st_size < 250:
-        
-        print(f"{dfn} not found, downloading!")
-
-        # Convert the path back into a list (without)
-        # the filename -- we need to check that directories
-        # exist first.
-        path = os.path.split(dest)
-        
-        # Create any missing directories in dest(ination) path
-        # -- os.path.join is the reverse of split (as you saw above)
-        # but it doesn't work with lists... so I had to google how
-        # to use the 'splat' operator! os.makedirs creates missing
-        # directories in a path automatically.
-        if len(path) >= 1 and path[0] != '':
-            os.makedirs(os.path.join(*path), exist_ok=True)
-            
-        # Download and write the file
-        with open(dfn, "wb") as file:
-            response = get(src)
-            file.write(response.content)
-            
-        print("\tDone downloading...")
+    dfn = os.path.join(dest,fn) # Destination filename
+    
+    return cache_file(src, dfn, chunk_size=chunk_size, revalidate=revalidate, session=session)
+
+def cache_file(src:str, dfn:str, **kwargs) -> str:
+    """Fetches `src` into the store and makes it available as `dfn`.
+    
+    This is shared by `cache_data` and `dtools.get_url`, which differ 
+    only in how they work out the local filename.
+    """
+    entry = _load_manifest(CACHE_DIR).get(src)
+    sfn   = _store_path(CACHE_DIR, src)
+    
+    # If the local copy is already in place then there's no need to
+    # go anywhere near the store. It has to *be* the file in the store 
+    # (i.e. a hard link to it) or a copy that we made of it: another
+    # URL with the same filename could have been saved here since.
+    if entry is not None and not kwargs.get('revalidate'):
+        try:
+            st = os.stat(dfn)
+            if (os.path.samefile(sfn, dfn) and st.st_size == entry['size']) or \
+                    entry.get('copies', {}).get(os.path.abspath(dfn)) == [st.st_size, st.st_mtime_ns]:
+                print(f"Found {dfn} locally!")
+                entry['accessed'] = time.time()
+                return dfn
+        except FileNotFoundError:
+            pass
+    
+    materialise(fetch(src, legacy=dfn, label=dfn, **kwargs), dfn)
+    
+    # If the store is on another drive we had to copy the file, so 
+    # remember which copy we made so that we can recognise it again.
+    entry = _load_manifest(CACHE_DIR).get(src)
+    if entry is not None and not os.path.samefile(sfn, dfn):
+        st = os.stat(dfn)
+        entry.setdefault('copies', {})[os.path.abspath(dfn)] = [st.st_size, st.st_mtime_ns]
+    return dfn
 
-        # What's this doing???
-        f_size = os.stat(dfn).st_size
-        print(f"\tSize is {f_size/1024**2:,.0f} MB ({f_size:,} bytes)")
+def cache_many(urls:list, dest:str, max_workers:int=8, per_host:int=4, **kwargs) -> dict:
+    """Downloads and caches many remote files at once.
+    
+    Rather than waiting for each download to finish before starting
+    the next, this hands the URLs to a pool of threads that share a
+    single pool of connections. So that we don't hammer any one server,
+    no more than `per_host` downloads run against the same host at a
+    time. Files that are already cached return immediately, so this is
+    a cheap way to 'warm up' the cache at the start of a practical. 
+    Since each file is saved in `dest` under its own filename, URLs that
+    share a filename (e.g. listings.csv.gz for two cities) raise a 
+    ValueError and need to go into different directories.
+    
+    Parameters
+    ----------
+    urls : list
+        The remote *sources* for the files.
+    dest : str
+        The *destination* location to save the downloaded files.
+    max_workers : int
+        The maximum number of downloads to run at once.
+    per_host : int
+        The maximum number of downloads to run against one host.
+    **kwargs
+        Any other arguments are passed on to `cache_data`.
+        
+    Returns
+    -------
+    dict
+        A dictionary mapping each URL to the local location of the file.
+    """
+    urls  = list(dict.fromkeys(urls)) # De-duplicate but keep the order
+    hosts = {urlparse(u).netloc: threading.BoundedSemaphore(per_host) for u in urls}
+    
+    # Files are saved in `dest` under the filename from the URL so two
+    # URLs with the same filename (e.g. Inside Airbnb's listings.csv.gz
+    # for two cities) would overwrite each other.
+    names = {}
+    for u in urls:
+        names.setdefault(os.path.split(urlparse(u).path)[-1], []).append(u)
+    clashes = {fn: us for fn, us in names.items() if len(us) > 1}
+    if clashes:
+        detail = "; ".join(f"{fn} ({', '.join(us)})" for fn, us in clashes.items())
+        raise ValueError(f"Several URLs would be saved to the same file in {dest}: {detail}")
+    
+    with Session() as session:
+        adapter = HTTPAdapter(pool_connections=max(len(hosts),1), pool_maxsize=max_workers)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        
+        def _one(src:str) -> str:
+            with hosts[urlparse(src).netloc]:
+                return cache_data(src, dest, session=session, **kwargs)
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            return dict(zip(urls, pool.map(_one, urls)))
 
-    else:
-        print(f"Found {dfn} locally!")
+# Strings that look like ISO dates (e.g. '2024-06-14' or 
+# '2024-06-14 09:30:00'), which is what Inside Airbnb uses.
+_iso_date = re.compile(r'^\d{4}-\d{2}-\d{2}(?:[T ]\d{2}:\d{2}(?::\d{2})?)?$')
 
-        # And why is it here as well???
-        f_size = os.stat(dfn).st_size
-        print(f"\tSize is {f_size/1024**2:,.0f} MB ({f_size:,} bytes)")
+def _infer_types(df, category_ratio:float=0.05, sample:int=1000):
+    """Converts the columns of a freshly-read CSV file to better types.
+    
+    Text columns whose values are all ISO dates become datetimes
+    and text columns with only a few distinct values (relative to the 
+    number of rows) become categoricals, which is what we would do by 
+    hand after loading the Inside Airbnb data.
+    """
+    import pandas as pd
+    
+    for c in df.columns:
+        if not pd.api.types.is_string_dtype(df[c]):
+            continue
+        vals = df[c].dropna()
+        if len(vals) == 0:
+            continue
+        head = vals.iloc[:sample].astype(str)
+        if head.str.match(_iso_date).all():
+            # The sample is only a guide: if anything further down 
+            # isn't an ISO date then the column is left as it is.
+            try:
+                df[c] = pd.to_datetime(df[c], format='ISO8601')
+                continue
+            except (ValueError, TypeError):
+                pass
+        if vals.nunique() <= category_ratio * len(vals):
+            df[c] = df[c].astype('category')
+    return df
+
+def read_cached(src:str, columns:list=None, refresh:bool=False, **kwargs):
+    """Reads a (possibly remote) CSV file via a typed Parquet sidecar.
+    
+    The first time that a CSV or CSV.gz file is read we parse it with
+    pandas, tidy up the column types (see `_infer_types`) and save the
+    result as a Parquet file alongside the original. Every read after 
+    that skips the slow decompress-and-parse step entirely and loads the
+    (memory-mapped) Parquet file instead. If the CSV file changes (e.g.
+    because it was downloaded again) then the sidecar is rebuilt.
+    
+    Parameters
+    ----------
+    src : str
+        A URL (which will be cached in the store first) or local path.
+    columns : list
+        Only load these columns (much faster than loading everything).
+    refresh : bool
+        Rebuild the Parquet sidecar even if it looks up-to-date.
+    **kwargs
+        Any other arguments are passed to `pandas.read_csv` when the 
+        sidecar is built (e.g. `low_memory=False`). Each combination
+        of arguments gets a sidecar of its own, except for `usecols`,
+        which is treated like `columns`.
+        
+    Returns
+    -------
+    pandas.DataFrame
+        The data frame.
+    """
+    import pandas as pd
+    
+    # Download the file first if this is a URL
+    path = fetch(src) if urlparse(src).scheme in ('http', 'https') else src
+    
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path, columns=columns, memory_map=True)
+    if not (path.endswith('.csv') or path.endswith('.csv.gz')):
+        raise ValueError(f"Don't know how to cache {path} as Parquet")
+    
+    # The sidecar needs to hold *all* of the columns so that
+    # it's useful next time, so we subset it afterwards.
+    usecols = kwargs.pop('usecols', None)
+    if columns is None and usecols is not None:
+        columns = list(usecols)
+    
+    # Anything else given to read_csv (e.g. nrows, sep or dtype) can 
+    # change what ends up in the sidecar, so each combination of them
+    # gets a sidecar of its own.
+    pqt = path + '.parquet'
+    if kwargs:
+        key = json.dumps(kwargs, sort_keys=True, default=repr).encode('utf-8')
+        pqt = f"{path}.{hashlib.sha1(key).hexdigest()[:12]}.parquet"
+    if refresh or not os.path.isfile(pqt) or os.stat(pqt).st_mtime < os.stat(path).st_mtime:
+        print(f"Converting {path} to Parquet...")
+        df = _infer_types(pd.read_csv(path, **kwargs))
         
-    return dfn
\ No newline at end of file
+        # As with downloads, the file only appears once it's complete
+        df.to_parquet(pqt + '.tmp', engine='pyarrow', compression='zstd', index=False)
+        os.replace(pqt + '.tmp', pqt)
+        return df[columns] if columns is not None else df
+    
+    return pd.read_parquet(pqt, columns=columns, memory_map=True)
+
+def _to_expression(filters):
+    """Turns the filters given to `load_parquet` into a pyarrow expression.
+    
+    Filters can be a dictionary (`{'room_type': 'Private room'}` or,
+    to match any of several values, `{'room_type': ['Private room', 
+    'Shared room']}`), a list of `(column, op, value)` tuples as used 
+    by `pandas.read_parquet`, or a pyarrow expression already.
+    """
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+    
+    if filters is None or isinstance(filters, ds.Expression):
+        return filters
+    if isinstance(filters, dict):
+        expr = None
+        for col, val in filters.items():
+            if isinstance(val, (list, tuple, set)):
+                term = ds.field(col).isin(list(val))
+            else:
+                term = ds.field(col) == val
+            expr = term if expr is None else expr & term
+        return expr
+    return pq.filters_to_expression(filters)
+
+def load_parquet(src:str, columns:list=None, filters=None, categories:list=None):
+    """Loads only the columns and rows that you need from a Parquet file.
+    
+    Rather than reading an entire file and then throwing most of it away,
+    the column selection and row filters are handed to pyarrow so that 
+    only the requested columns are read and any row group whose statistics 
+    show that it can't match the filter is skipped without being read at 
+    all. Text columns that were saved as categoricals stay dictionary-
+    encoded (so they arrive as pandas categoricals). This works on single
+    files, on GeoParquet files (giving back a GeoDataFrame) and on 
+    partitioned directories of Parquet files.
+    
+    Parameters
+    ----------
+    src : str
+        A URL (which will be cached in the store first) or local path.
+    columns : list
+        The columns to load (all columns if None).
+    filters : dict, list, or pyarrow.dataset.Expression
+        The rows to load, e.g. `{'room_type': 'Private room'}` or 
+        `[('price', '<', 100)]` (see `_to_expression`).
+    categories : list
+        Text columns to read as categoricals (dictionary-encoded) even
+        though they weren't saved that way.
+        
+    Returns
+    -------
+    pandas.DataFrame or geopandas.GeoDataFrame
+        The data frame.
+    """
+    import pyarrow.dataset as ds
+    
+    # Download the file first if this is a URL
+    path = fetch(src) if urlparse(src).scheme in ('http', 'https') else src
+    expr = _to_expression(filters)
+    
+    # Partitioned datasets written by convert-gz-to-parquet.py record
+    # the schema that all of their files should be read with (since
+    # the older files can have narrower types) in `_common_metadata`.
+    schema = None
+    common = os.path.join(path, '_common_metadata')
+    if os.path.isdir(path) and os.path.isfile(common):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        schema = pq.read_schema(common)
+        for c in categories or []:
+            i = schema.get_field_index(c)
+            if i >= 0 and not pa.types.is_dictionary(schema.field(i).type):
+                schema = schema.set(i, schema.field(i).with_type(pa.dictionary(pa.int32(), schema.field(i).type)))
+    
+    fmt     = ds.ParquetFileFormat(dictionary_columns=categories or [])
+    dataset = ds.dataset(path, schema=schema, format=fmt, partitioning='hive')
+    meta    = dataset.schema.metadata or {}
+    
+    # GeoParquet needs to be turned back into geometries; geopandas 
+    # passes the filter through to pyarrow so we still get pushdown.
+    if b'geo' in meta:
+        import geopandas as gpd
+        geom = json.loads(meta[b'geo'])['primary_column']
+        if columns is not None and geom not in columns:
+            columns = list(columns) + [geom]
+        return gpd.read_parquet(path, columns=columns, filters=expr, read_dictionary=categories)
+    
+    return dataset.to_table(columns=columns, filter=expr).to_pandas()
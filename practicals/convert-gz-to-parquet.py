@@ -1,23 +1,471 @@
-import pandas as pd
-import geopandas as gpd
+"""Converts an Inside Airbnb listings file (CSV or CSV.gz) to Parquet.
+
+The file is read in batches using pyarrow's streaming CSV reader so
+that we never hold more than a row group's worth of data in memory,
+and both the Parquet and (optionally) GeoParquet outputs are written
+in the same pass. How each column should be typed can be given on the
+command line or in a JSON 'spec' file such as:
+
+    {
+        "types":      {"id": "int64", "price": "string"},
+        "dates":      ["last_scraped", "host_since", "first_review", "last_review"],
+        "categories": ["property_type", "room_type"],
+        "lon": "longitude",
+        "lat": "latitude"
+    }
+
+Any column not mentioned in the spec has its type inferred by pyarrow
+from the first batch. Columns that are empty in the first batch are
+read as text and, if a later batch turns out not to fit the type that
+was inferred (e.g. an ID that looks numeric at first but isn't), the 
+column is widened (integers to floats, anything else to text) and the
+conversion starts again. To avoid that, add the column to "types". 
+Nothing appears under the output filename until the conversion has
+succeeded.
+
+Usage:
+
+    python convert-gz-to-parquet.py listings.csv.gz --parquet listings.parquet \\
+        --geoparquet listings.geoparquet --spec listings.json
+
+Many scrapes can also be collected into one hive-partitioned dataset
+(by default partitioned on scrape date and borough) so that adding a
+new scrape only writes the new data:
+
+    python convert-gz-to-parquet.py 2024-06-14-listings.csv.gz --dataset listings/
+"""
 import os
+import re
+import sys
+import glob
+import json
+import argparse
+import itertools
+import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pcsv
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# What the original version of this script did by hand
+DEFAULT_SRC  = os.path.join('practicals','data','clean','2024-06-14-listings.csv.gz')
+DEFAULT_SPEC = {
+    'types':      {},
+    'dates':      ['last_scraped', 'host_since', 'first_review', 'last_review'],
+    'categories': ['property_type', 'room_type'],
+    'lon':        'longitude',
+    'lat':        'latitude',
+    'partition_by': ['scrape_date', 'neighbourhood_cleansed'],
+}
+
+# The column that records which scrape each row came from
+# when several of them are combined into one dataset.
+SNAPSHOT_COL = 'scrape_date'
+
+# The file (in the dataset's directory) that records the schema
+# that every snapshot should be read with; pyarrow ignores files 
+# whose names start with '_' when it looks for data.
+COMMON_METADATA = '_common_metadata'
+
+def load_spec(path:str=None, **overrides) -> dict:
+    """Loads a JSON spec (if given) on top of the defaults.
+
+    Any keyword arguments that are not None replace the value from
+    the spec file, so command-line options always 'win'.
+    """
+    spec = {k: (v.copy() if hasattr(v, 'copy') else v) for k, v in DEFAULT_SPEC.items()}
+    if path is not None:
+        with open(path, 'r') as f:
+            spec.update(json.load(f))
+    spec.update({k: v for k, v in overrides.items() if v is not None})
+    return spec
+
+def column_types(spec:dict) -> dict:
+    """Translates a spec into the column types pyarrow's CSV reader wants."""
+    types = {c: pa.type_for_alias(t) for c, t in spec.get('types', {}).items()}
+    for c in spec.get('dates', []):
+        types[c] = pa.timestamp('ms')
+    for c in spec.get('categories', []):
+        types[c] = pa.dictionary(pa.int32(), pa.string())
+    return types
+
+def _open_csv(src:str, types:dict, block_size:int):
+    """Opens a CSV(.gz) file with pyarrow's streaming reader.
+    
+    pyarrow decompresses .gz files on the fly and the listings data
+    has descriptions that span several lines, so we have to tell the
+    parser that newlines can appear inside quoted values.
+    """
+    return pcsv.open_csv(
+        src,
+        read_options    = pcsv.ReadOptions(block_size=block_size),
+        parse_options   = pcsv.ParseOptions(newlines_in_values=True),
+        convert_options = pcsv.ConvertOptions(column_types=types,
+                                              timestamp_parsers=[pcsv.ISO8601, '%Y-%m-%d']),
+    )
+
+def infer_types(src:str, spec:dict, block_size:int=16 * 1024**2) -> dict:
+    """Works out the type of every column from the first batch.
+    
+    Columns in the spec get the type given there and pyarrow infers 
+    the rest, except that a column that is empty in the first batch 
+    (which pyarrow would make a 'null' column that can't hold anything)
+    is read as text.
+    """
+    reader = _open_csv(src, column_types(spec), block_size)
+    schema = reader.schema
+    reader.close()
+    return {f.name: (pa.string() if pa.types.is_null(f.type) else f.type) for f in schema}
+
+def stream_batches(src:str, spec:dict, block_size:int=16 * 1024**2, types:dict=None):
+    """Yields record batches from a CSV(.gz) file without loading it all.
+    
+    src: the CSV or CSV.gz file to read
+    spec: how to type the columns (see `load_spec`)
+    block_size: the number of bytes read for each batch
+    types: the type of every column (see `infer_types`), which takes
+        precedence over the spec
+    """
+    for batch in _open_csv(src, types or column_types(spec), block_size):
+        yield batch
+
+# e.g. "In CSV column #12: Row #299992: CSV conversion error to int64: invalid value 'LIC'"
+conversion_error = re.compile(r'In CSV column #(\d+): .*CSV conversion error to ([^:]+):')
+
+def with_widening(src:str, spec:dict, write, block_size:int=16 * 1024**2):
+    """Calls `write(types)` until every column can be converted.
+    
+    The types inferred from the first batch (see `infer_types`) can
+    turn out to be too narrow further down the file, at which point 
+    pyarrow gives up. When that happens the offending column is 
+    widened (integers become floats and anything else becomes text)
+    and `write` is called again to start from the beginning. Columns
+    whose type was given in the spec are never changed: if they can't
+    be converted that's an error.
+    
+    Returns whatever `write` returns.
+    """
+    fixed = column_types(spec)
+    types = infer_types(src, spec, block_size)
+    names = list(types)
+    while True:
+        try:
+            return write(types)
+        except pa.ArrowInvalid as e:
+            m = conversion_error.search(str(e))
+            if m is None:
+                raise
+            name = names[int(m.group(1))]
+            if name in fixed:
+                raise ValueError(f"Column '{name}' can't be read as {fixed[name]} as the spec says: {e}") from e
+            wider = pa.float64() if pa.types.is_integer(types[name]) else pa.string()
+            print(f"\t'{name}' can't be read as {types[name]}, starting again with {wider}...")
+            types[name] = wider
+
+def points_to_wkb(lon:pa.Array, lat:pa.Array) -> pa.Array:
+    """Builds WKB point geometries from two coordinate arrays.
+
+    A WKB point is just a byte-order flag, a geometry type, and the two
+    coordinates packed together (21 bytes) so it's easy to build them all
+    at once with NumPy rather than creating one shapely object per row.
+    Rows with a missing coordinate get a missing (null) geometry.
+    """
+    n   = len(lon)
+    wkb = np.empty(n, dtype=[('order','u1'), ('type','<u4'), ('x','<f8'), ('y','<f8')])
+    wkb['order'] = 1 # Little-endian
+    wkb['type']  = 1 # Point
+    wkb['x']     = pc.cast(lon, pa.float64()).to_numpy(zero_copy_only=False)
+    wkb['y']     = pc.cast(lat, pa.float64()).to_numpy(zero_copy_only=False)
+
+    offsets = np.arange(0, (n + 1) * wkb.itemsize, wkb.itemsize, dtype=np.int32)
+    geoms   = pa.Array.from_buffers(pa.binary(), n, [None, pa.py_buffer(offsets), pa.py_buffer(wkb.tobytes())])
+
+    valid = pc.and_(pc.is_valid(lon), pc.is_valid(lat))
+    if pc.all(valid).as_py():
+        return geoms
+    return pc.if_else(valid, geoms, pa.scalar(None, pa.binary()))
+
+def geo_schema(schema:pa.Schema) -> pa.Schema:
+    """Adds a WKB 'geometry' column and GeoParquet metadata to a schema.
+
+    We don't write a 'crs' for the column: GeoParquet then assumes
+    OGC:CRS84 (longitude/latitude on WGS84), which is what Inside
+    Airbnb's coordinates are.
+    """
+    meta = {
+        'version': '1.0.0',
+        'primary_column': 'geometry',
+        'columns': {'geometry': {'encoding': 'WKB', 'geometry_types': ['Point']}},
+    }
+    return schema.append(pa.field('geometry', pa.binary())).with_metadata(
+        {**(schema.metadata or {}), b'geo': json.dumps(meta).encode('utf-8')})
+
+def convert(src:str, parquet:str=None, geoparquet:str=None, spec:dict=None,
+            row_group_size:int=128 * 1024, compression:str='zstd') -> int:
+    """Streams a CSV(.gz) file into Parquet and/or GeoParquet files.
+
+    Batches are gathered until there are enough rows to fill a row
+    group and are then written out, so memory use depends on the
+    row group size and not on the size of the input file.
+
+    src: the CSV or CSV.gz file to convert
+    parquet: where to write the Parquet output (optional)
+    geoparquet: where to write the GeoParquet output (optional)
+    spec: how to type the columns (see `load_spec`)
+    row_group_size: the number of rows in each row group
+    compression: the Parquet compression codec to use
+
+    Returns the number of rows converted.
+    """
+    spec    = spec or load_spec()
+    outputs = [fn for fn in [parquet, geoparquet] if fn is not None]
+    
+    # Everything is written to a temporary file first so that a 
+    # conversion that fails part of the way through can't leave 
+    # something that looks like a complete file behind.
+    def write(types:dict) -> int:
+        writers = {}
+        pending, n_pending, n_rows = [], 0, 0
+        
+        def flush():
+            if not pending:
+                return
+            table = pa.Table.from_batches(pending)
+            if parquet is not None:
+                writers[parquet].write_table(table, row_group_size=row_group_size)
+            if geoparquet is not None:
+                geom = points_to_wkb(table.column(spec['lon']).combine_chunks(),
+                                     table.column(spec['lat']).combine_chunks())
+                writers[geoparquet].write_table(table.append_column('geometry', geom),
+                                                row_group_size=row_group_size)
+            pending.clear()
+        
+        try:
+            for batch in stream_batches(src, spec, types=types):
+                if not writers:
+                    if parquet is not None:
+                        writers[parquet] = pq.ParquetWriter(parquet + '.tmp', batch.schema, 
+                                                            compression=compression)
+                    if geoparquet is not None:
+                        writers[geoparquet] = pq.ParquetWriter(geoparquet + '.tmp', geo_schema(batch.schema),
+                                                               compression=compression)
+                pending.append(batch)
+                n_pending += batch.num_rows
+                n_rows    += batch.num_rows
+                if n_pending >= row_group_size:
+                    flush()
+                    n_pending = 0
+            flush()
+        finally:
+            for w in writers.values():
+                w.close()
+        return n_rows
+    
+    try:
+        n_rows = with_widening(src, spec, write)
+    except BaseException:
+        for fn in outputs:
+            if os.path.exists(fn + '.tmp'):
+                os.remove(fn + '.tmp')
+        raise
+    
+    for fn in outputs:
+        if os.path.exists(fn + '.tmp'):
+            os.replace(fn + '.tmp', fn)
+    return n_rows
+
+def snapshot_date(src:str) -> str:
+    """Works out the scrape date from a filename like '2024-06-14-listings.csv.gz'."""
+    m = re.match(r'(\d{4})-?(\d{2})-?(\d{2})', os.path.basename(src))
+    if m is None:
+        raise ValueError(f"Can't work out the scrape date from {src}, please give one with --snapshot")
+    return '-'.join(m.groups())
+
+def dataset_schema(base_dir:str) -> pa.Schema:
+    """Returns the schema that every snapshot in a dataset is read with.
+
+    This is saved as `_common_metadata` whenever a scrape is added (see
+    `convert_to_dataset`) since the files for older scrapes can have
+    narrower types (e.g. integer `bathrooms` before a scrape that has
+    '1.5'). For datasets written before we did that, it is worked out
+    by combining the schemas of all of the files.
+    """
+    common = os.path.join(base_dir, COMMON_METADATA)
+    if os.path.isfile(common):
+        return pq.read_schema(common)
+    dataset  = ds.dataset(base_dir, format='parquet', partitioning='hive')
+    physical = pa.unify_schemas([f.physical_schema for f in dataset.get_fragments()],
+                                promote_options='permissive')
+    return pa.schema([physical.field(n) if n in physical.names else dataset.schema.field(n)
+                      for n in dataset.schema.names])
+
+def merge_schemas(schema:pa.Schema, new:pa.Schema) -> pa.Schema:
+    """Works out the schema a dataset needs so that a new scrape fits.
+
+    Where a column's type differs between the dataset and the new
+    scrape we use the wider of the two (e.g. float64 rather than int64,
+    or text rather than a column that has only ever been empty) so that
+    nothing is lost. Numbers, dates and so on can also be stored in a
+    text column, but any other mismatch means that the column needs to
+    be given a type in the spec so that every scrape agrees. Columns
+    that first appear in the new scrape are added to the end (and so
+    are read as nulls for the earlier scrapes).
+    """
+    fields = []
+    added  = [f.with_nullable(True) for f in new if f.name not in schema.names]
+    for field in list(schema) + added:
+        if field.name in new.names:
+            other = new.field(field.name)
+            try:
+                field = pa.unify_schemas([pa.schema([field]), pa.schema([other])],
+                                         promote_options='permissive').field(0)
+            except (pa.ArrowTypeError, pa.ArrowInvalid):
+                if not (pa.types.is_string(field.type) or pa.types.is_large_string(field.type)):
+                    raise ValueError(f"Column '{field.name}' is {field.type} in the dataset but {other.type} "
+                                     f"in this scrape: please give it a type in the spec") from None
+        # A column that has only ever been empty can't hold anything
+        if pa.types.is_null(field.type):
+            field = field.with_type(pa.string())
+        fields.append(field)
+    return pa.schema(fields, metadata=schema.metadata)
+
+def align(batch:pa.RecordBatch, schema:pa.Schema) -> pa.RecordBatch:
+    """Makes a batch match the schema of an existing dataset.
+
+    Scrapes from different dates don't always have the same columns,
+    so columns that are missing from this scrape are filled with nulls
+    (new ones are added to the schema by `merge_schemas`) so that every 
+    snapshot can be read back together. The casts are 'safe' so a value
+    that doesn't fit (which `merge_schemas` should make impossible) 
+    raises an error rather than being mangled.
+    """
+    extra = set(batch.schema.names) - set(schema.names)
+    if extra:
+        raise ValueError(f"Columns missing from the dataset schema: {', '.join(sorted(extra))}")
+    arrays = []
+    for field in schema:
+        if field.name in batch.schema.names:
+            arrays.append(pc.cast(batch.column(field.name), field.type))
+        else:
+            arrays.append(pa.nulls(batch.num_rows, field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+def convert_to_dataset(src:str, base_dir:str, spec:dict=None, snapshot:str=None,
+                       row_group_size:int=128 * 1024, compression:str='zstd') -> int:
+    """Appends one scrape to a hive-partitioned Parquet dataset.
+
+    Each row gets a `scrape_date` column and the rows are written into
+    directories such as `scrape_date=2024-06-14/neighbourhood_cleansed=Hackney/`
+    so that an analysis of one date or borough only has to read the
+    matching files. If the dataset already exists then the new scrape
+    is made to match its schema (which is widened if need be, see
+    `merge_schemas`) and only this scrape's files are written, so 
+    adding a scrape never rewrites the earlier ones. The schema that
+    all of the scrapes should be read with is saved alongside them
+    as `_common_metadata` (see `dataset_schema`). Converting the same
+    scrape again replaces it.
+
+    src: the CSV or CSV.gz file to convert
+    base_dir: the directory holding the dataset
+    spec: how to type the columns (see `load_spec`)
+    snapshot: the scrape date (worked out from the filename if None)
+    row_group_size: the maximum number of rows in each row group
+    compression: the Parquet compression codec to use
+
+    Returns the number of rows converted.
+    """
+    spec     = spec or load_spec()
+    snapshot = snapshot or snapshot_date(src)
+    parts    = spec.get('partition_by') or [SNAPSHOT_COL]
+    date     = pa.scalar(snapshot, pa.string())
+
+    # If there's already data here then new snapshots need to match it
+    existing = None
+    if os.path.isdir(base_dir) and any(os.scandir(base_dir)):
+        existing = dataset_schema(base_dir)
+
+    def write(types:dict) -> tuple:
+        # Unless the scrape date is part of the partitioning (in which
+        # case `delete_matching` does this for us), get rid of anything
+        # left by an earlier conversion of this scrape.
+        if SNAPSHOT_COL not in parts and os.path.isdir(base_dir):
+            for fn in glob.glob(os.path.join(glob.escape(base_dir), '**', f"{glob.escape(snapshot)}-*.parquet"),
+                                recursive=True):
+                os.remove(fn)
+
+        batches = stream_batches(src, spec, types=types)
+        first   = next(batches)
+        schema  = first.schema.append(pa.field(SNAPSHOT_COL, pa.string()))
+        if existing is not None:
+            schema = merge_schemas(existing, schema)
+
+        # Partition columns come back from the directory names
+        # as plain strings, so they are written that way too.
+        schema = pa.schema([schema.field(n) if n not in parts else pa.field(n, pa.string())
+                            for n in schema.names], metadata=schema.metadata)
+
+        n_rows = 0
+        def with_snapshot():
+            nonlocal n_rows
+            for batch in itertools.chain([first], batches):
+                n_rows += batch.num_rows
+                batch = batch.append_column(SNAPSHOT_COL, pa.repeat(date, batch.num_rows))
+                yield align(batch, schema)
 
-df = pd.read_csv(os.path.join('practicals','data','clean','2024-06-14-listings.csv.gz'))
+        # When the scrape date is part of the partitioning we can safely 
+        # replace anything already written for this date; otherwise files
+        # are named after the scrape so they can't collide with others.
+        ds.write_dataset(
+            with_snapshot(), base_dir, schema=schema, format='parquet',
+            partitioning=ds.partitioning(pa.schema([schema.field(p) for p in parts]), flavor='hive'),
+            basename_template=f"{snapshot}-{{i}}.parquet",
+            existing_data_behavior='delete_matching' if SNAPSHOT_COL in parts else 'overwrite_or_ignore',
+            file_options=ds.ParquetFileFormat().make_write_options(compression=compression),
+            max_rows_per_group=row_group_size,
+            min_rows_per_group=min(row_group_size, 16 * 1024),
+        )
+        return n_rows, schema
 
-df2 = df.copy()
+    n_rows, schema = with_widening(src, spec, write)
+    pq.write_metadata(schema, os.path.join(base_dir, COMMON_METADATA))
+    return n_rows
 
-df2['last_scraped'] = pd.to_datetime(df2.last_scraped)
-df2['host_since'] = pd.to_datetime(df2.host_since)
-df2['first_review'] = pd.to_datetime(df2.first_review)
-df2['last_review'] = pd.to_datetime(df2.last_review)
+def main(argv:list=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('src', nargs='?', default=DEFAULT_SRC, help='CSV or CSV.gz file to convert')
+    parser.add_argument('--parquet', help='Parquet file to write')
+    parser.add_argument('--geoparquet', help='GeoParquet file to write (needs --lon and --lat)')
+    parser.add_argument('--dataset', help='Partitioned dataset directory to add this scrape to')
+    parser.add_argument('--snapshot', help='Scrape date for --dataset (default: from the filename)')
+    parser.add_argument('--partition-by', nargs='*', help='Columns to partition --dataset on')
+    parser.add_argument('--spec', help='JSON file describing the column types')
+    parser.add_argument('--dates', nargs='*', help='Columns to parse as dates')
+    parser.add_argument('--categories', nargs='*', help='Columns to store as categoricals')
+    parser.add_argument('--lon', help='Longitude column (for GeoParquet)')
+    parser.add_argument('--lat', help='Latitude column (for GeoParquet)')
+    parser.add_argument('--row-group-size', type=int, default=128 * 1024, help='Rows per row group')
+    parser.add_argument('--compression', default='zstd', help='Parquet compression codec')
+    args = parser.parse_args(argv)
 
-df2['property_type'] = df2.property_type.astype('category')
-df2['room_type'] = df2.room_type.astype('category')
+    spec = load_spec(args.spec, dates=args.dates, categories=args.categories, lon=args.lon, lat=args.lat,
+                     partition_by=args.partition_by)
 
-df2.to_parquet('20240614-London-listings.parquet', engine='pyarrow', compression='zstd')
+    if args.dataset is not None:
+        n = convert_to_dataset(args.src, args.dataset, spec, snapshot=args.snapshot,
+                               row_group_size=args.row_group_size, compression=args.compression)
+        print(f"Added {n:,} rows from {args.src} to {args.dataset}")
+        if args.parquet is None and args.geoparquet is None:
+            return
 
-gdf = gpd.GeoDataFrame(df2, geometry=gpd.points_from_xy(df2.longitude, df2.latitude, crs='EPSG:4326'))
+    # With no outputs given we do what this script always did
+    if args.parquet is None and args.geoparquet is None:
+        args.parquet    = '20240614-London-listings.parquet'
+        args.geoparquet = '20240614-London-listings.geoparquet'
 
-gdf.to_parquet('20240614-London-listings.geoparquet')
+    n = convert(args.src, args.parquet, args.geoparquet, spec,
+                row_group_size=args.row_group_size, compression=args.compression)
+    print(f"Converted {n:,} rows from {args.src}")
 
-exit()
\ No newline at end of file
+if __name__ == '__main__':
+    main(sys.argv[1:])
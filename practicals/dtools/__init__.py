@@ -1,39 +1,55 @@
 import os
 import csv
-from urllib.request import urlopen
 import numpy as np
+from itertools import islice
 
 def get_url(src, dest):
+    """
+    Downloads a remote file to a local destination, unless 
+    we have already done so (in which case it is returned
+    straight away). 
     
-    # Check if dest does *not* exist -- that
-    # would mean we had to download it!
-    if not os.path.isfile(dest):
-        print(f"{dest} not found, downloading!")
-        
-        # Get the data using the urlopen function
-        response = urlopen(src) 
-        filedata = response.read().decode('utf-8')
-        
-        # Extract the part of the dest(ination) that is *not*
-        # the actual filename--have a look at how 
-        # os.path.split works using `help(os.path.split)`
-        path = list(os.path.split(dest)[:-1])
-        
-        # Create any missing directories in dest(ination) path
-        # -- os.path.join is the reverse of split (as you saw above)
-        # but it doesn't work with lists... so I had to google how 
-        # to use the 'splat' operator! os.makedirs creates missing 
-        # directories in a path automatically.
-        if len(path) >= 1 and path[0] != '':
-            os.makedirs(os.path.join(*path), exist_ok=True)
-        
-        with open(dest, 'w') as f:
-            f.write(filedata)
-            
-    else:
-        print(f"Found {dest} locally!")
+    The actual downloading and caching is handled by the same
+    engine that sits behind `cache.cache_data` so that both of
+    them share one store (see cache.py for how to configure it).
+    That needs cache.py (which sits next to this package) and 
+    `requests`, so they are only imported when you download 
+    something and the rest of dtools works without them.
     
-    return dest
+    :param src: the remote *source* for the file
+    :param dest: the local *destination* filename
+    :returns: the destination filename
+    """
+    return _cache_module().cache_file(src, dest)
+
+# Where to find cache.py (next to this package)
+CACHE_PY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cache.py')
+
+def _cache_module():
+    """
+    Returns the cache module, loaded from `CACHE_PY` rather than by
+    name so that some other `cache` module on the path can't be picked
+    up by mistake (and so that we don't have to change sys.path). If 
+    it has already been imported as `cache` then that copy is used so
+    that there is only one set of in-memory manifests.
+    
+    :returns: the cache module
+    """
+    import sys
+    import importlib.util
+    for name in ('cache', 'dtools._cache'):
+        mod = sys.modules.get(name)
+        if mod is not None and os.path.abspath(getattr(mod, '__file__', None) or '') == CACHE_PY:
+            return mod
+    spec = importlib.util.spec_from_file_location('dtools._cache', CACHE_PY)
+    mod  = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = mod
+    try:
+        spec.loader.exec_module(mod)
+    except BaseException:
+        del sys.modules[spec.name]
+        raise
+    return mod
 
 def read_csv(src:str) -> dict:
     """
@@ -68,6 +84,396 @@ def read_csv(src:str) -> dict:
     # Return dictionary of lists
     return csvdata
 
+# How many values to look at when guessing a column's type
+INFER_ROWS = 1000
+
+def _to_array(cdata:np.ndarray, ctype, masked:bool=False) -> np.ndarray:
+    """
+    Converts a column of strings to a NumPy array of the requested
+    type in one go (rather than value-by-value). Values that can't be
+    converted become NaN (or NaT for dates) or, if `masked` is True,
+    are masked out instead. Integer columns with missing values are
+    returned as floats unless `masked` is True, as in pandas.
+    
+    :param cdata: a NumPy array of strings (dtype=object)
+    :param ctype: the type to convert to (e.g. float, int, bool, str, 'datetime64[D]')
+    :param masked: return a masked array marking unparseable values
+    :returns: a NumPy array (or masked array)
+    
+    >>> _to_array(np.array(['1', '2.5', ''], dtype=object), int)
+    array([ 1., nan, nan])
+    >>> _to_array(np.array(['1', '2.5', ''], dtype=object), int, masked=True).mask
+    array([False,  True,  True])
+    """
+    ctype = np.dtype(ctype)
+    
+    # Text stays as Python strings: a fixed-width NumPy string
+    # array would pad *every* value to the longest one (at 4 bytes
+    # a character) and so usually takes up more memory, not less.
+    if ctype.kind in 'UO':
+        return cdata
+    
+    if ctype.kind == 'b':
+        arr = np.isin(cdata, ['True','true','TRUE'])
+        if masked:
+            return np.ma.masked_array(arr, mask=~(arr | np.isin(cdata, ['False','false','FALSE'])))
+        return arr
+    
+    # The quick route: NumPy converts the whole column in one go.
+    # This only fails if there's something unparseable in the column, 
+    # in which case we work out which values are the problem.
+    try:
+        arr  = cdata.astype(ctype)
+        mask = np.zeros(cdata.shape, dtype=bool)
+    except (ValueError, TypeError):
+        rtype = ctype if ctype.kind in 'fM' else np.dtype(float)
+        bad   = np.datetime64('NaT') if ctype.kind == 'M' else np.nan
+        
+        # Empty cells are the most common culprit and can be
+        # dealt with without looking at each value in turn.
+        mask = cdata == ''
+        try:
+            arr = np.where(mask, 'NaT' if ctype.kind == 'M' else 'nan', cdata).astype(rtype)
+        except (ValueError, TypeError):
+            arr = np.empty(cdata.shape, dtype=rtype)
+            for i, c in enumerate(cdata):
+                try:
+                    arr[i] = rtype.type(c) if not mask[i] else bad
+                except (ValueError, TypeError):
+                    arr[i], mask[i] = bad, True
+        
+        # Parsing as floats lets through values (e.g. '2.5' or 'inf')
+        # that aren't integers, so those count as unparseable too.
+        if ctype.kind in 'iu':
+            bad  = ~np.isfinite(arr) | (arr != np.floor(arr))
+            mask = mask | bad
+            arr[bad] = np.nan
+        
+        # Integers can't hold NaN so they stay as floats
+        # unless we can mask out the missing values.
+        if ctype.kind in 'iu' and masked:
+            arr = np.where(mask, 0, arr).astype(ctype)
+    
+    if masked:
+        return np.ma.masked_array(arr, mask=mask)
+    return arr
+
+def _infer_type(cdata:np.ndarray):
+    """
+    Guesses the type of a column of strings by seeing what the
+    first few non-empty values can be converted to.
+    
+    :param cdata: a NumPy array of strings (dtype=object)
+    :returns: int, float, bool or str
+    """
+    vals = cdata[:INFER_ROWS]
+    vals = vals[vals != '']
+    if vals.size == 0:
+        return str
+    if np.isin(vals, ['True','true','TRUE','False','false','FALSE']).all():
+        return bool
+    for ctype in [int, float]:
+        try:
+            vals.astype(ctype)
+            return ctype
+        except (ValueError, TypeError):
+            pass
+    return str
+
+def _pad(rows, ncols:int) -> list:
+    """
+    Makes every row the same length as the header, filling short rows 
+    with empty cells and dropping any extra cells from long ones (as
+    `read_csv` does).
+    
+    :param rows: an iterable of lists of strings (e.g. a csv.reader)
+    :param ncols: the number of columns in the header
+    :returns: a list of lists of strings
+    """
+    return [r[:ncols] if len(r) >= ncols else r + [''] * (ncols - len(r)) for r in rows]
+
+def _read_cells(src:str) -> tuple:
+    """
+    Reads a CSV file into its column names and a 2D array of strings.
+    NumPy's `loadtxt` parses the file in C, but it won't deal with
+    rows that have the wrong number of cells, so for those files we 
+    fall back on the csv module (making every row as long as the
+    header).
+    
+    :param src: a local CSV file
+    :returns: a list of column names and a 2D NumPy array (dtype=object)
+    """
+    with open(src, 'r', newline='') as f:
+        csvcols = next(csv.reader(f))
+        try:
+            cells = np.loadtxt(f, dtype=object, delimiter=',', quotechar='"', 
+                               comments=None, ndmin=2)
+            # Every row could be the same (wrong) length
+            if cells.size > 0 and cells.shape[1] != len(csvcols):
+                raise ValueError("rows don't match the header")
+        except ValueError:
+            f.seek(0)
+            csvr = csv.reader(f)
+            next(csvr)
+            cells = np.array(_pad(csvr, len(csvcols)), dtype=object)
+    
+    if cells.size == 0:
+        cells = np.empty((0, len(csvcols)), dtype=object)
+    return csvcols, cells
+
+def _read_arrow(src:str, dtypes:dict, masked:bool=False) -> dict:
+    """
+    Reads a CSV file using pyarrow's (multi-threaded, C++) CSV 
+    reader and converts each column straight to its type without
+    creating a Python string for every cell: only the text columns
+    (and any column with an unparseable value in it, which is 
+    handed to `_to_array`) need Python strings. Empty cells are 
+    read as missing values.
+    
+    :param src: a local CSV file
+    :param dtypes: a dictionary mapping column names to types
+    :param masked: return masked arrays marking values that couldn't 
+        be converted (otherwise they become NaN)
+    :returns: a dictionary of NumPy arrays, or None if pyarrow isn't 
+        installed or can't parse the file (e.g. a row is the wrong 
+        length or it isn't UTF-8)
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.csv as pcsv
+        import pyarrow.compute as pc
+    except ImportError:
+        return None
+    
+    with open(src, 'r', newline='') as f:
+        csvcols = next(csv.reader(f))
+    
+    # Read everything as (nullable) strings and do the conversion
+    # ourselves so that a column's type is never guessed by Arrow.
+    try:
+        table = pcsv.read_csv(src, 
+            parse_options=pcsv.ParseOptions(newlines_in_values=True),
+            convert_options=pcsv.ConvertOptions(
+                column_types={c: pa.string() for c in csvcols},
+                null_values=[''], strings_can_be_null=True, 
+                quoted_strings_can_be_null=True))
+    except pa.ArrowException:
+        return None
+    
+    csvdata = {}
+    for c, col in zip(csvcols, table.columns):
+        
+        ctype = dtypes.get(c)
+        if ctype is None:
+            ctype = _infer_type(col.slice(0, INFER_ROWS).fill_null('').to_numpy(zero_copy_only=False))
+        ctype = np.dtype(ctype)
+        
+        if ctype.kind == 'b':
+            arr = pc.is_in(col, value_set=pa.array(['True','true','TRUE'])).to_numpy(zero_copy_only=False)
+            if masked:
+                no = pc.is_in(col, value_set=pa.array(['False','false','FALSE'])).to_numpy(zero_copy_only=False)
+                arr = np.ma.masked_array(arr, mask=~(arr | no))
+            csvdata[c] = arr
+            continue
+        
+        if ctype.kind in 'iufM':
+            # Dates are parsed to the second and then truncated 
+            # (Arrow won't parse a time of day into a date).
+            atype = pa.timestamp('s') if ctype.kind == 'M' else pa.from_numpy_dtype(ctype)
+            try:
+                conv = pc.cast(col, atype)
+            except pa.ArrowInvalid:
+                conv = None
+            if conv is not None:
+                mask = col.is_null().to_numpy(zero_copy_only=False)
+                if ctype.kind in 'iu' and masked:
+                    arr = pc.fill_null(conv, 0).to_numpy(zero_copy_only=False)
+                else:
+                    # Missing integers become NaN (as floats)
+                    arr = conv.to_numpy(zero_copy_only=False)
+                if ctype.kind == 'M':
+                    arr = arr.astype(ctype)
+                csvdata[c] = np.ma.masked_array(arr, mask=mask) if masked else arr
+                continue
+        
+        # Text, or a column with something unparseable in it
+        csvdata[c] = _to_array(col.fill_null('').to_numpy(zero_copy_only=False), ctype, masked)
+    
+    return csvdata
+
+def read_typed_csv(src:str, dtypes:dict=None, masked:bool=False) -> dict:
+    """
+    Reads a CSV file into a dictionary of NumPy arrays (one per
+    column), using the first row to create column names. Unlike 
+    `read_csv` followed by `to_type`, the file is parsed in C and 
+    each column is converted all at once, so this is much faster 
+    and the numeric columns take up a fraction of the memory of a 
+    list of strings. If pyarrow is installed the numeric columns
+    are parsed straight to numbers; otherwise NumPy is used.
+    
+    :param src: a local CSV file
+    :param dtypes: a dictionary mapping column names to types (e.g. 
+        {'Latitude': float, 'Arrest': bool}); columns that aren't
+        mentioned have their type inferred
+    :param masked: return masked arrays marking values that couldn't 
+        be converted (otherwise they become NaN)
+    :returns: a dictionary of NumPy arrays
+    """
+    dtypes = dtypes or {}
+    csvdata = _read_arrow(src, dtypes, masked)
+    if csvdata is not None:
+        return csvdata
+    
+    csvcols, cells = _read_cells(src)
+    
+    csvdata = {}
+    for idx, c in enumerate(csvcols):
+        cdata = cells[:, idx]
+        csvdata[c] = _to_array(cdata, dtypes.get(c) or _infer_type(cdata), masked)
+    
+    return csvdata
+
+def iter_csv(src:str, chunksize:int=10000, dtypes:dict=None, masked:bool=False):
+    """
+    Reads a CSV file a chunk at a time, yielding a dictionary of 
+    NumPy arrays (as `read_typed_csv` does) for every `chunksize` 
+    rows. Only one chunk is held in memory at a time, so this works 
+    for files that are too large to load all at once. Column types
+    that aren't given in `dtypes` are inferred from the first chunk
+    and then used for every chunk after that so that they all agree.
+    
+    :param src: a local CSV file
+    :param chunksize: the number of rows in each chunk
+    :param dtypes: a dictionary mapping column names to types
+    :param masked: return masked arrays marking values that couldn't 
+        be converted (otherwise they become NaN)
+    :returns: a generator of dictionaries of NumPy arrays
+    """
+    dtypes = dict(dtypes or {})
+    
+    with open(src, 'r', newline='') as f:
+        csvr    = csv.reader(f)
+        csvcols = next(csvr)
+        
+        while True:
+            rows = list(islice(csvr, chunksize))
+            if not rows:
+                break
+            cells = np.array(_pad(rows, len(csvcols)), dtype=object).T
+            
+            chunk = {}
+            for idx, c in enumerate(csvcols):
+                if c not in dtypes:
+                    dtypes[c] = _infer_type(cells[idx])
+                chunk[c] = _to_array(cells[idx], dtypes[c], masked)
+            yield chunk
+
+class OnlineStats:
+    """
+    Keeps running statistics for a column that is read one chunk at 
+    a time (see `iter_csv`) so that they can be calculated in a single 
+    pass without ever holding the whole column in memory. Missing 
+    (NaN or masked) values are ignored, as with NumPy's nan-functions.
+    
+    The mean and variance are combined chunk-by-chunk using Chan et 
+    al.'s parallel version of Welford's algorithm, which avoids the
+    rounding problems of keeping a running sum of squares.
+    """
+    def __init__(self):
+        self.count  = 0
+        self.rows   = 0 # Rows seen so far (for argmin/argmax)
+        self.mean   = np.nan
+        self.m2     = 0.0
+        self.min    = np.nan
+        self.max    = np.nan
+        self.argmin = None
+        self.argmax = None
+    
+    def update(self, col:np.ndarray) -> 'OnlineStats':
+        """
+        Adds a chunk of values to the running statistics.
+        
+        :param col: a NumPy (or masked) array of numbers
+        :returns: self (so that calls can be chained)
+        """
+        vals = np.ma.filled(np.ma.asarray(col, dtype=float), np.nan)
+        ok   = ~np.isnan(vals)
+        n    = int(ok.sum())
+        
+        if n > 0:
+            idx  = np.flatnonzero(ok)
+            good = vals[ok]
+            
+            lo, hi = good.argmin(), good.argmax()
+            if self.count == 0 or good[lo] < self.min:
+                self.min, self.argmin = good[lo], self.rows + idx[lo]
+            if self.count == 0 or good[hi] > self.max:
+                self.max, self.argmax = good[hi], self.rows + idx[hi]
+            
+            mean  = good.mean()
+            m2    = ((good - mean)**2).sum()
+            if self.count == 0:
+                self.mean, self.m2 = mean, m2
+            else:
+                total      = self.count + n
+                delta      = mean - self.mean
+                self.mean += delta * n / total
+                self.m2   += m2 + delta**2 * self.count * n / total
+            self.count += n
+        
+        self.rows += len(vals)
+        return self
+    
+    @property
+    def var(self) -> float:
+        """The (population) variance, as with `np.var`."""
+        return self.m2 / self.count if self.count > 0 else np.nan
+    
+    @property
+    def std(self) -> float:
+        """The (population) standard deviation, as with `np.std`."""
+        return np.sqrt(self.var)
+    
+    @property
+    def sum(self) -> float:
+        return self.mean * self.count if self.count > 0 else 0.0
+    
+    def get(self, val:str):
+        """
+        Returns a statistic by name so that this can stand in for 
+        a column in `find_val` (where 'min' and 'max' give the 
+        row at which they occur, not the value itself).
+        """
+        lkp = {'min': self.argmin, 'max': self.argmax, 'argmin': self.argmin, 
+               'argmax': self.argmax, 'mean': self.mean, 'var': self.var, 
+               'std': self.std, 'sum': self.sum, 'count': self.count}
+        return lkp.get(val, np.nan)
+    
+    def __repr__(self):
+        return (f"OnlineStats(count={self.count}, min={self.min}, max={self.max}, "
+                f"mean={self.mean}, std={self.std})")
+
+def column_stats(src:str, columns:list=None, chunksize:int=10000, dtypes:dict=None) -> dict:
+    """
+    Calculates summary statistics for the numeric columns of a CSV
+    file in a single pass, holding only one chunk in memory at a time.
+    
+    :param src: a local CSV file
+    :param columns: the columns to summarise (defaults to all numeric columns)
+    :param chunksize: the number of rows to read at a time
+    :param dtypes: a dictionary mapping column names to types
+    :returns: a dictionary mapping column names to `OnlineStats`
+    """
+    stats = {}
+    for chunk in iter_csv(src, chunksize, dtypes):
+        for c, col in chunk.items():
+            if columns is None and col.dtype.kind not in 'iuf':
+                continue
+            if columns is not None and c not in columns:
+                continue
+            stats.setdefault(c, OnlineStats()).update(col)
+    return stats
+
 # Convert the raw data to data of the appropriate
 # type: 'column data' (cdata) -> 'column type' (ctype)
 def to_type(cdata, ctype):
@@ -96,8 +502,17 @@ def to_type(cdata, ctype):
 
 def find_val(col:list, val:str):
     """
+    Applies the NumPy function named by `val` to a column, except
+    that 'min' and 'max' return the row at which they occur. `col`
+    can also be an `OnlineStats` (see `column_stats`) in which case
+    the answer comes from the statistics gathered as it was read.
     
+    :param col: a column of data (or an `OnlineStats`)
+    :param val: the name of a NumPy function (e.g. 'mean' or 'max')
+    :returns: the result (or NaN if there isn't a function called `val`)
     """
+    if isinstance(col, OnlineStats):
+        return col.get(val)
     if val in dir(np) and callable(getattr(np, val)):
         func = getattr(np, val)
         if val in ['min','max']:
@@ -1,13 +1,20 @@
-import pandas as pd
 import os
 import re
 import sys
 #import math # May be needed for isnan
 import time
 import html
-import nltk
+import html.entities
+from html.parser import HTMLParser
 import string
 import unicodedata
+import json
+import pickle
+import sqlite3
+import hashlib
+import multiprocessing as mp
+from functools import partial, wraps
+from collections import OrderedDict
 
 # Deals with Icelandic and other non-ASCII
 # characters in a more straightforward way
@@ -16,63 +23,293 @@ from unidecode import unidecode
 
 DEBUG = False
 
+# Part of the key for cached documents (see `DocumentCache`) so
+# this *must* be changed whenever a change to the module changes
+# the output of any of the cleaning functions.
+__version__ = '2.0.0'
+
+# What `from textual import *` brings in: what it always has (bar the
+# NLTK resources, BeautifulSoup, pandas and nltk themselves, which
+# are only added once `warmup()` has loaded them) and the new entry
+# points, but none of the helpers that the pipeline is built from.
+__all__ = [
+    'os', 're', 'sys', 'time', 'html', 'string', 'unicodedata', 'unidecode', 'warnings', 'DEBUG',
+    'decode', 'pos_tagger', 'pos_tags', 'case_lemma', 'lemmatise', 'smart_quotes', 'sq',
+    'remove_quotemarks', 'areg', 'remove_accented_chars', 'CONTRACTION_MAP', 'contracts',
+    'remove_contractions', 'expand_contractions', 'possessives', 'remove_possessives',
+    'remove_special_chars', 'NUMBER_MAP', 'formatted_nums', 'expand_numbers', 'remove_stopwords',
+    'pk', 'hy', 'remove_punctuation', 'punkts', 'remove_short_text', 'remove_short_lines',
+    'strip_html_tags', 'strip_html', 'entities', 'err', 'pkerr', 'herr', 'fix_ner_errors',
+    'preamble_re', 'detect_publications', 'prefix_re', 'suffix_re', 'paren_re', 'detect_entities',
+    'acro', 'extras', 'detect_acronyms', 'multiples', 'translate_table', 'translate_numbers',
+    'normalise_document',
+    # New in 2.0
+    'warmup', 'instruments', 'lemmatise_many', 'lemmatise_tokens', 'detect_entities_batch',
+    'entity_substitutions', 'substitute_entities', 'TextPipeline', 'DocumentCache', 'normalise_corpus',
+]
+
+###########################
+# Opt-in instrumentation: switch it on to find out where the time
+# goes when cleaning a corpus (lemmatisation? BeautifulSoup? NER?)
+# without having to attach cProfile. While it's switched off the 
+# instrumented functions do nothing more than check a flag.
+#
+#   with instruments:
+#       df.description.apply(normalise_document)
+#   instruments.to_frame()
+#   instruments.to_json('profile.json')
+#
+# Each process has its own counters so, when using normalise_corpus
+# with n_jobs > 1, only the work done in the main process is counted.
+###########################
+class Instrumentation:
+    """
+    Collects the number of calls, cumulative time and the size of the
+    text going in and out (in bytes, as UTF-8) for each instrumented 
+    function, together with the hit rates of the module's caches.
+    """
+    def __init__(self):
+        self.enabled = False
+        self.reset()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        """Zeroes all of the counters (but not the caches' own statistics)."""
+        self.counters = {}
+
+    def __enter__(self):
+        self._was_enabled = self.enabled
+        self.enable()
+        return self
+
+    def __exit__(self, *exc):
+        self.enabled = self._was_enabled
+        return False
+
+    def record(self, name:str, seconds:float, bytes_in:int=0, bytes_out:int=0):
+        """Adds a call to `name` that took `seconds` to the counters."""
+        c = self.counters.get(name)
+        if c is None:
+            c = self.counters[name] = {'calls': 0, 'seconds': 0.0, 'bytes_in': 0, 'bytes_out': 0}
+        c['calls']     += 1
+        c['seconds']   += seconds
+        c['bytes_in']  += bytes_in
+        c['bytes_out'] += bytes_out
+
+    def stats(self) -> dict:
+        """
+        Returns a dictionary of the counters for each function 
+        (sorted by cumulative time) and of the cache statistics.
+        """
+        functions = {}
+        for name, c in sorted(self.counters.items(), key=lambda x: x[1]['seconds'], reverse=True):
+            functions[name] = dict(c, per_call_us=c['seconds'] / c['calls'] * 1e6)
+        total = _pattern_stats['hits'] + _pattern_stats['misses']
+        patterns = dict(_pattern_stats, hit_rate=_pattern_stats['hits'] / total if total > 0 else 0.0, size=len(_patterns))
+        return {'functions': functions, 
+                'caches': {'lemma_cache': lemma_cache.stats(), 'patterns': patterns}}
+
+    def to_frame(self) -> 'pd.DataFrame':
+        """Returns the function counters as a data frame (one row per function)."""
+        import pandas as pd
+        df = pd.DataFrame.from_dict(self.stats()['functions'], orient='index',
+                                    columns=['calls','seconds','per_call_us','bytes_in','bytes_out'])
+        df.index.name = 'function'
+        return df
+
+    def to_json(self, path:str=None, indent:int=2) -> str:
+        """
+        Returns the statistics as JSON and, if `path` is given,
+        also writes them to that file.
+        """
+        js = json.dumps(self.stats(), indent=indent)
+        if path is not None:
+            with open(path, 'w') as f:
+                f.write(js)
+        return js
+
+instruments = Instrumentation()
+
+def _nbytes(text) -> int:
+    if not isinstance(text, str):
+        return 0
+    return len(text) if text.isascii() else len(text.encode('utf-8', 'surrogatepass'))
+
+def instrumented(func):
+    """
+    Decorator that records calls to `func` in `instruments` (but 
+    only while instrumentation is switched on). The first argument 
+    and the return value are taken to be the text in and out.
+    """
+    name = func.__name__
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if not instruments.enabled:
+            return func(*args, **kwargs)
+        tic = time.perf_counter()
+        out = func(*args, **kwargs)
+        instruments.record(name, time.perf_counter() - tic, 
+                           _nbytes(args[0]) if args else 0, _nbytes(out))
+        return out
+    return wrapper
+
 ###########################
 # Download NLTK libraries if we haven't already
 # downloaded and saved them. This _can_ be done
 # while building the Docker image but could then
 # leave those not using Docker high and dry.
+#
+# Nothing is loaded (or downloaded) until it's first
+# needed, so importing this module is quick and functions
+# like `remove_punctuation` can be used without loading 
+# NLTK at all. Call `warmup()` to load everything up front
+# (e.g. before starting to time something). The resources 
+# can still be accessed as `textual.stopword_list`, etc. but
+# `from textual import *` only picks them up (as it used to) 
+# once `warmup()` has been called: they aren't in `__all__` 
+# until then since that would make the star import load them.
+# The same goes for pandas (`pd`), `nltk` and `stopwords`:
+#
+#   import textual; textual.warmup()
+#   from textual import *
 ###########################
-try:
-    nltk.data.load('tokenizers/punkt/english.pickle')
-except LookupError as e:
-    print("Unable to load punkt, downloading...")
-    nltk.download('punkt')
-    nltk.data.load('tokenizers/punkt/english.pickle')
-
-try: 
-    from nltk.corpus import stopwords
-    stopword_list = set(stopwords.words('english'))
-except LookupError as e:
-    print("Unable to load stopwords, downloading...")
-    nltk.download('stopwords')
-    from nltk.corpus import stopwords
-    stopword_list = set(stopwords.words('english'))
+def _nltk_load(loader, *packages):
+    """
+    Calls `loader`, downloading the NLTK packages it
+    needs first if they aren't available.
+    """
+    try:
+        return loader()
+    except LookupError as e:
+        print(f"Unable to load {packages[-1]}, downloading...")
+        import nltk
+        for p in packages:
+            nltk.download(p)
+        return loader()
+
+def _load_sent_tokenize():
+    def loader():
+        import nltk
+        nltk.data.load('tokenizers/punkt/english.pickle')
+        return nltk.tokenize.sent_tokenize
+    return _nltk_load(loader, 'punkt')
+
+def _load_stopword_list():
+    def loader():
+        from nltk.corpus import stopwords
+        return set(stopwords.words('english'))
+    stopword_list = _nltk_load(loader, 'stopwords')
+    # How to update the stopword list... 
+    stopword_list.update([
+    #    'thesis','dissertation','chapter','chapters','research','result','results',
+    #    'methodology','approach','understand','understanding','demonstrate','find', 
+    ])
+    return stopword_list
 
 # Alternate tokenizer: 
 #from nltk.tokenize.toktok import ToktokTokenizer
 #wtok = ToktokTokenizer()
-try:
-    wtok = nltk.tokenize.treebank.TreebankWordTokenizer()
-    nltk.pos_tag(wtok.tokenize("A test of the perceptron tagger"))
-except LookupError as e:
-    print("Unable to load POS tagger, downloading...")
-    nltk.download('averaged_perceptron_tagger')
-    wtok = nltk.tokenize.treebank.TreebankWordTokenizer()
-    nltk.pos_tag(wtok.tokenize("A test of the perceptron tagger"))
-
-try:
-    from nltk.corpus import wordnet as wn 
-    lm = nltk.stem.wordnet.WordNetLemmatizer()
-    lm.lemmatize("ran")
-except LookupError as e:
-    print("Unable to load WordNet, downloading...") 
-    nltk.download('omw-1.4')
-    nltk.download('wordnet')
-    from nltk.corpus import wordnet as wn 
-    lm = nltk.stem.wordnet.WordNetLemmatizer()
+def _load_wtok():
+    from nltk.tokenize.treebank import TreebankWordTokenizer
+    return TreebankWordTokenizer()
+
+# This is the tagger that nltk.pos_tag uses but, depending on the
+# version of NLTK, pos_tag may load it again on every call!
+def _load_tagger():
+    def loader():
+        from nltk.tag.perceptron import PerceptronTagger
+        tagger = PerceptronTagger()
+        tagger.tag(_get('wtok').tokenize("A test of the perceptron tagger"))
+        return tagger
+    return _nltk_load(loader, 'averaged_perceptron_tagger')
+
+def _load_wn():
+    def loader():
+        from nltk.corpus import wordnet as wn 
+        wn.ADJ # Looking anything up loads the corpus
+        return wn
+    return _nltk_load(loader, 'omw-1.4', 'wordnet')
+
+def _load_lm():
+    _get('wn')
+    from nltk.stem.wordnet import WordNetLemmatizer
+    lm = WordNetLemmatizer()
     lm.lemmatize("ran")
+    return lm
+
+def _load_beautiful_soup():
+    from bs4 import BeautifulSoup
+    return BeautifulSoup
+
+def _load_pd():
+    import pandas as pd
+    return pd
 
-from nltk.tokenize import sent_tokenize
+def _load_nltk():
+    import nltk
+    return nltk
+
+def _load_stopwords():
+    # The corpus itself is only read when it's first used
+    from nltk.corpus import stopwords
+    return stopwords
+
+def _load_pos_lkp():
+    pos_lkp  = {}
+    for p in pos_tags.split("\n"):
+        m = re.search(r"^\| ([A-Z\$]{2,5})\s+\| ([^\|]+)", p)
+        pos_lkp[m.groups()[0]] = m.groups()[1].strip()
+    return pos_lkp
+
+_loaders = {
+    'sent_tokenize': _load_sent_tokenize,
+    'stopword_list': _load_stopword_list,
+    'wtok':          _load_wtok,
+    'tagger':        _load_tagger,
+    'wn':            _load_wn,
+    'lm':            _load_lm,
+    'BeautifulSoup': _load_beautiful_soup,
+    'pos_lkp':       _load_pos_lkp,
+    'pd':            _load_pd,
+    'nltk':          _load_nltk,
+    'stopwords':     _load_stopwords,
+}
+_loaded = {}
 
-print("All NLTK libraries installed...")
+def _get(name:str):
+    """Returns the named resource, loading it the first time it's needed."""
+    try:
+        return _loaded[name]
+    except KeyError:
+        value = _loaded[name] = _loaders[name]()
+        return value
 
-# How to update the stopword list... 
-stopword_list.update([
-#    'thesis','dissertation','chapter','chapters','research','result','results',
-#    'methodology','approach','understand','understanding','demonstrate','find', 
-])
+def __getattr__(name:str):
+    # Only called for names that aren't already in the module
+    if name in _loaders:
+        return _get(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-from bs4 import BeautifulSoup
+def warmup(*names, verbose:bool=True):
+    """
+    Loads (and, if necessary, downloads) the NLTK resources, 
+    BeautifulSoup and pandas so that the first document processed 
+    isn't slowed down by this. With no arguments everything is loaded, otherwise
+    just the named resources (e.g. warmup('stopword_list')).
+    
+    The loaded resources are also added to the module's namespace
+    so that `from textual import *` afterwards imports them too.
+    """
+    for name in (names or _loaders):
+        globals()[name] = _get(name)
+        if name not in __all__:
+            __all__.append(name)
+    if verbose: print("All NLTK libraries installed...")
 
 # Utility function for dealing with uncertain 
 # encodings. This is a pretty brutal approach
@@ -103,14 +340,16 @@ def pos_tagger(nltk_tag):
 
     nltk_tag: a NLTK POS tag to be translated to a Wordnet tag
     """
+    # These are wn.ADJ, wn.VERB, etc. but written out so that 
+    # we don't need to load WordNet just to look them up.
     if nltk_tag.startswith('J'): 
-        return wn.ADJ 
+        return 'a' # wn.ADJ 
     elif nltk_tag.startswith('V'): 
-        return wn.VERB 
+        return 'v' # wn.VERB 
     elif nltk_tag.startswith('N'): 
-        return wn.NOUN 
+        return 'n' # wn.NOUN 
     elif nltk_tag.startswith('R'): 
-        return wn.ADV 
+        return 'r' # wn.ADV 
     else:           
         return None
 
@@ -190,11 +429,75 @@ pos_tags = """| CC | coordinating conjunction |
 | WP | possessive |
 | WRB | wh-abverb |"""
 
-global pos_lkp
-pos_lkp  = {}
-for p in pos_tags.split("\n"):
-    m = re.search(r"^\| ([A-Z\$]{2,5})\s+\| ([^\|]+)", p)
-    pos_lkp[m.groups()[0]] = m.groups()[1].strip()
+# Lemmatisation is expensive but a corpus's vocabulary is much 
+# smaller than its word count (most words turn up over and over 
+# again), so we remember the lemma for each (word, POS) pair that
+# we've already seen. The cache is bounded so that it can't grow
+# forever on a very large corpus: once it's full the least-recently
+# used entry is thrown away.
+class LemmaCache:
+    """
+    A bounded (word, POS) -> lemma cache that keeps track of how 
+    often it is used. It can be saved to disk and re-loaded so that
+    the next run doesn't have to start from scratch:
+
+        lemma_cache.save('lemmas.pickle')
+        lemma_cache.load('lemmas.pickle')
+
+    maxsize: the maximum number of entries to keep
+    path: an optional file from which to load a saved cache
+    """
+    def __init__(self, maxsize:int=100000, path:str=None):
+        self.maxsize = maxsize
+        self.hits    = 0
+        self.misses  = 0
+        self._data   = OrderedDict()
+        if path is not None and os.path.isfile(path):
+            self.load(path)
+
+    def get(self, key):
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
+        self.hits = self.misses = 0
+
+    def stats(self) -> dict:
+        """Returns the hits, misses, hit rate and size of the cache."""
+        total = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 
+                'hit_rate': self.hits / total if total > 0 else 0.0,
+                'size': len(self._data), 'maxsize': self.maxsize}
+
+    def save(self, path:str):
+        """Saves the cached lemmas (but not the statistics) to disk."""
+        with open(path + '.tmp', 'wb') as f:
+            pickle.dump(list(self._data.items()), f)
+        os.replace(path + '.tmp', path)
+
+    def load(self, path:str):
+        """Adds the lemmas saved in `path` to the cache."""
+        with open(path, 'rb') as f:
+            for key, value in pickle.load(f):
+                self.put(key, value)
+
+    def __len__(self):
+        return len(self._data)
+
+lemma_cache = LemmaCache()
 
 # https://stackoverflow.com/a/57917378/4041902
 def case_lemma(word, pos):
@@ -203,22 +506,32 @@ def case_lemma(word, pos):
     already been converted to lowercase. This can be useful
     because it deals more effectively with acronyms, terms-of-
     art and so on. You don't usually call this directly as it's
-    used by the 'lemmatise' function.
+    used by the 'lemmatise' function. Results are remembered in
+    `lemma_cache` so each (word, POS) pair is only lemmatised once.
 
     word: the term to be lemmatised
     pos:  the part-of-speech (which influences lemmatisation)
     """
+    key   = (word, pos_tagger(pos))
+    lemma = lemma_cache.get(key)
+    if lemma is None:
+        lemma = _case_lemma(word, key[1])
+        lemma_cache.put(key, lemma)
+    return lemma
+
+acronym_re = re.compile(r"^[A-Z\.]+$")
+def _case_lemma(word, wn_pos):
     try: 
-        if word.isupper() or re.match(r"^[A-Z\.]+$", word): # Likely acronyms shouldn't title-case
-            word = lm.lemmatize(word, pos=pos_tagger(pos)).upper()
+        if word.isupper() or acronym_re.match(word): # Likely acronyms shouldn't title-case
+            word = _get('lm').lemmatize(word, pos=wn_pos).upper()
             #print(f"case_lemma[upper]({word}, {pos})")
         elif word == word.title():
-            word = lm.lemmatize(word, pos=pos_tagger(pos)).capitalize()
+            word = _get('lm').lemmatize(word, pos=wn_pos).capitalize()
             #print(f"case_lemma[title]({word}, {pos})")
         else:
-            word = lm.lemmatize(word, pos=pos_tagger(pos))
+            word = _get('lm').lemmatize(word, pos=wn_pos)
     except KeyError:
-        if DEBUG: print(f"Can't process: {t[0]} / {pos_tagger(t[1])}")
+        if DEBUG: print(f"Can't process: {word} / {wn_pos}")
         pass
 
     return word
@@ -227,46 +540,93 @@ def case_lemma(word, pos):
 # Notice that we again assume that the text is not yet lower-case
 # since this allows us to work as late as possible with the 
 # cased text, thus giving more time to detect names, acronyms, etc.
+@instrumented
 def lemmatise(text:str) -> str:
     """
     Performs lemmatisation of a sentence or paragraph while trying
     to respect some fairly sophisticated pre-processing that might
     include phrase detection (e.g. Geographic_Information_Systems).
+    If you have many documents then `lemmatise_many` is faster.
 
     text: a sentence or paragraph to be lemmatised.
     """
-    sents  = sent_tokenize(text)
-    lemmas = []
-    for s in sents:
-
-        # Word tokenizers is used to find the words  
-        # and punctuation in a string 
-        wordsList = wtok.tokenize(s)
-
-        # Using a part-of-speech  
-        # tagger or POS-tagger.  
-        tagged = nltk.pos_tag(wordsList)
-
-        slemmas = []
-
-        # For each of the tagged elements...
-        for t in tagged:
-            # Does it look like a phrase or other special case
-            # marked by a '_' linking two or more raw terms?
-            if '_' in t[0]:
-                ulemmas = []
-                for w in nltk.pos_tag(t[0].split('_')):
-                    ulemmas.append( case_lemma(w[0], w[1]) )
-                slemmas.append("_".join(ulemmas))
-            else:
-                slemmas.append( case_lemma(t[0], t[1]) )
-        lemmas.append(" ".join(slemmas))
-    
-    return " ".join(lemmas)
+    return lemmatise_many([text])[0]
+
+# The tagger has a fixed cost per call so, rather than tagging each 
+# sentence (and each phrase) separately, we collect everything that
+# needs tagging, tag it all in one go, and then put the lemmas back 
+# together in the right order. Each sentence (and phrase) is still 
+# tagged on its own so the tags are the same as before.
+@instrumented
+def lemmatise_many(texts:list) -> list:
+    """
+    Lemmatises a list of documents (see `lemmatise`), with one
+    call to the POS-tagger for the whole list.
+
+    texts: a list of sentences or paragraphs to be lemmatised.
+
+    Returns a list of lemmatised documents in the same order.
+    """
+    return [" ".join([" ".join(slemmas) for slemmas in doc]) for doc in _lemmatise_sents(texts)]
+
+@instrumented
+def lemmatise_tokens(text:str) -> list:
+    """
+    Lemmatises a document (see `lemmatise`) but returns the list
+    of lemmatised tokens rather than joining them back together.
+
+    text: a sentence or paragraph to be lemmatised.
+    """
+    return [lemma for slemmas in _lemmatise_sents([text])[0] for lemma in slemmas]
+
+def _lemmatise_sents(texts:list) -> list:
+    """
+    Does the work for `lemmatise_many` and `lemmatise_tokens`, 
+    returning a list (for each document) of lists (for each 
+    sentence) of lemmatised tokens.
+    """
+    wtok, sent_tokenize = _get('wtok'), _get('sent_tokenize')
+
+    # Word tokenizers is used to find the words  
+    # and punctuation in each sentence of each document
+    docs = [[wtok.tokenize(s) for s in sent_tokenize(text)] for text in texts]
+    sents = [words for doc in docs for words in doc]
+
+    # Does it look like a phrase or other special case
+    # marked by a '_' linking two or more raw terms? If 
+    # so then each of the terms is tagged separately.
+    phrases = [w.split('_') for words in sents for w in words if '_' in w]
+
+    # Using a part-of-speech  
+    # tagger or POS-tagger.  
+    tagged  = _get('tagger').tag_sents(sents + phrases)
+    ptagged = iter(tagged[len(sents):])
+    tagged  = iter(tagged[:len(sents)])
+
+    results = []
+    for doc in docs:
+        lemmas = []
+        for _ in doc:
+            slemmas = []
+            # For each of the tagged elements...
+            for t in next(tagged):
+                if '_' in t[0]:
+                    slemmas.append("_".join([case_lemma(w[0], w[1]) for w in next(ptagged)]))
+                else:
+                    slemmas.append( case_lemma(t[0], t[1]) )
+            lemmas.append(slemmas)
+        results.append(lemmas)
+    return results
 
 # These seem to come through surprisingly often and need to resolved
 smart_quotes = set(['‘','“','”','"','"',"’","‹","›","»","«","'","'"])
 sq = re.compile(f"({'|'.join(smart_quotes)})",flags=re.IGNORECASE|re.DOTALL)
+sqp = re.compile("\w’\w",flags=re.IGNORECASE|re.DOTALL)
+# Every quote mark becomes a space, so a character class does the same
+# job as `sq` and we can match the possessives in the same pass. 
+quote_chars = f"[{re.escape(''.join(sorted(smart_quotes)))}]"
+quotes = re.compile(f"{sqp.pattern}|{quote_chars}")
+@instrumented
 def remove_quotemarks(text:str) -> str:
     """
     Removes 'smart' quotes that seem to escape from the 
@@ -274,9 +634,9 @@ def remove_quotemarks(text:str) -> str:
 
     text: the input text.
     """
-    text = re.sub("\w’\w","'",text,flags=re.IGNORECASE|re.DOTALL) # This is for possessives
-    text = sq.sub(" ",text) # Get rid of everything else
-    return text
+    # The possessives used to be replaced with "'" but that was
+    # then immediately turned into a space along with everything else.
+    return quotes.sub(" ",text)
 
 # I have replaced the KDNuggets solution with a more 
 # straightforward approach that requires an external
@@ -285,6 +645,7 @@ def remove_quotemarks(text:str) -> str:
 # ASCII equivalent (å becomes a, and ß becomes Ss...)
 # Adapted from https://www.kdnuggets.com/2018/08/practitioners-guide-processing-understanding-text-2.html
 areg = re.compile('([a-z]+?)\?([a-z])', flags=re.IGNORECASE|re.DOTALL)
+@instrumented
 def remove_accented_chars(text:str) -> str:
     """
     Replaces accented characters from source text using a 
@@ -296,6 +657,62 @@ def remove_accented_chars(text:str) -> str:
     return areg.sub(r'\1\2', unidecode(text))
     #return unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('utf-8', 'ignore')
 
+# Functions like `expand_contractions` build a (large) regex out 
+# of the keys of a mapping. Rather than rebuilding that regex on
+# every call we keep the compiled pattern here, keyed on the kind
+# of pattern and the keys themselves (in order, since that's the
+# order in which they're tried). So a user-supplied mapping works
+# just as well as the default, even if it's a new dictionary every
+# time, and if its keys change the pattern is rebuilt. Only the most
+# recently used patterns are kept so this can't grow without limit.
+MAX_PATTERNS = 32
+_patterns = OrderedDict()
+_pattern_stats = {'hits': 0, 'misses': 0}
+def _mapping_pattern(kind:str, mapping:dict, template:str, flags=0):
+    """
+    Returns the compiled regex made by substituting the keys of 
+    `mapping` (see `_alternation`) into `template`, compiling it only if 
+    these keys haven't been seen recently.
+
+    kind: a name for the type of pattern (e.g. 'contractions')
+    mapping: the dictionary whose keys make up the pattern
+    template: a format string with a single '{}' for the keys
+    flags: regex flags
+    """
+    key     = (kind, template, flags, tuple(mapping))
+    pattern = _patterns.get(key)
+    if pattern is not None:
+        _pattern_stats['hits'] += 1
+        _patterns.move_to_end(key)
+        return pattern
+    _pattern_stats['misses'] += 1
+    pattern = re.compile(template.format(_alternation(mapping.keys())), flags=flags)
+    _patterns[key] = pattern
+    if len(_patterns) > MAX_PATTERNS:
+        _patterns.popitem(last=False)
+    return pattern
+
+def _alternation(keys) -> str:
+    """
+    Joins the keys into a regex alternation ('a|b|c'). A long, flat 
+    alternation is slow because at every position in the text the 
+    regex engine has to try every key in turn, so instead we group 
+    the keys by their first letter (keeping their original order) and
+    add a lookahead for those letters. Only one group can ever match 
+    at a given position, so what gets matched is exactly the same as
+    with the flat version, but most positions are rejected at once.
+    """
+    keys   = list(keys)
+    groups = OrderedDict()
+    for k in keys:
+        # Keys that start with a regex special character can't be
+        # grouped like this, so fall back to a flat alternation.
+        if not k or re.escape(k[0]) != k[0]:
+            return '|'.join(keys)
+        groups.setdefault(k[0].lower(), []).append(k)
+    first = ''.join(c + c.upper() for c in groups)
+    return '(?=[{}])(?:{})'.format(first, '|'.join('(?:{})'.format('|'.join(g)) for g in groups.values()))
+
 # From https://www.kdnuggets.com/2018/08/practitioners-guide-processing-understanding-text-2.html
 # From https://stackoverflow.com/questions/19790188/expanding-english-language-contractions-in-python
 global CONTRACTION_MAP
@@ -439,6 +856,7 @@ def remove_contractions(text):
 # This captures a wide range of contractions, though 
 # I don't know if we should also be capturing the 
 # possessive and fixing that as well... 
+@instrumented
 def expand_contractions(text, contraction_mapping=CONTRACTION_MAP):
     """
     Uses a map of common contractions to replace 
@@ -448,8 +866,8 @@ def expand_contractions(text, contraction_mapping=CONTRACTION_MAP):
     text: the input text in which to replace contractions
     contraction_mapping: a dictionary of key/value pairs (defaults to one provided in this module)
     """
-    contractions_pattern = re.compile('({})'.format('|'.join(contraction_mapping.keys())), 
-                                      flags=re.IGNORECASE|re.DOTALL)
+    contractions_pattern = _mapping_pattern('contractions', contraction_mapping, '({})', 
+                                            flags=re.IGNORECASE|re.DOTALL)
     def expand_match(contraction):
         match = contraction.group(0)
         first_char = match[0]
@@ -480,6 +898,9 @@ def remove_possessives(text):
 # the only thing left should be fairly simple word, word-boundary
 # stuff.
 # Adapted from https://www.kdnuggets.com/2018/08/practitioners-guide-processing-understanding-text-2.html
+special_chars = re.compile(r'[^a-zA-z0-9\s\.\_\-]')
+special_chars_digits = re.compile(r'[^a-zA-z\s\.\_\-]')
+@instrumented
 def remove_special_chars(text:str, remove_digits:bool=False, replace_with_spaces:bool=True) -> str:
     """
     A final pass through the text to remove 'special characters'
@@ -491,8 +912,8 @@ def remove_special_chars(text:str, remove_digits:bool=False, replace_with_spaces
     remove_digits: boolean determining whether or not to remove digits (default: False)
     replace_with_spaces: boolean determining whether or not substitution is ' ' or '' (default: True)
     """
-    pattern = r'[^a-zA-z0-9\s\.\_\-]' if not remove_digits else r'[^a-zA-z\s\.\_\-]'
-    return re.sub(pattern, ' ' if replace_with_spaces else '', text)
+    pattern = special_chars if not remove_digits else special_chars_digits
+    return pattern.sub(' ' if replace_with_spaces else '', text)
 
 # Adapted from https://www.kdnuggets.com/2018/08/practitioners-guide-processing-understanding-text-2.html
 global NUMBER_MAP
@@ -509,6 +930,7 @@ NUMBER_MAP = {
 # it seemed like a valuable contribution at the time... this
 # will convert 125k to 125000, or 12.5b to 12500000000.
 formatted_nums = re.compile(r'(\d+)\s?,\s?(?=\d{3})', flags=re.DOTALL)
+@instrumented
 def expand_numbers(text:str, number_mapping=NUMBER_MAP):
     """
     Try to turn numbers into textual forma such that 125k
@@ -517,7 +939,7 @@ def expand_numbers(text:str, number_mapping=NUMBER_MAP):
     text: the text in which to expand numbers
     number_mapping: defaults to mapping provided in this module but can be specified.
     """
-    number_pattern = re.compile(r'([0-9]+(\.[0-9]+)?)\s?({})(?=\.|\s)'.format('|'.join(number_mapping.keys())), 
+    number_pattern = _mapping_pattern('numbers', number_mapping, r'([0-9]+(\.[0-9]+)?)\s?({})(?=\.|\s)', 
                                       flags=re.IGNORECASE|re.DOTALL)
     
     def expand_number_match(number):
@@ -533,6 +955,7 @@ def expand_numbers(text:str, number_mapping=NUMBER_MAP):
 # Since we don't want to force lower-case unnecessarily 
 # early, we want to set this up so that it's easy to
 # pass through cases as part of stopword filtering.
+@instrumented
 def remove_stopwords(text, is_lower_case=False):
     """
     Remove stopwords from text that may or may not already 
@@ -541,20 +964,24 @@ def remove_stopwords(text, is_lower_case=False):
     text: the text from which to remove stopwords
     is_lower_case: Boolean indicating whether or not the text should be treated as lower-case (default: False)
     """
-    tokens = wtok.tokenize(text)
+    tokens = _get('wtok').tokenize(text)
     tokens = [token.strip() for token in tokens]
+    filtered_text = ' '.join(_filter_stopwords(tokens, is_lower_case))    
+    return filtered_text
+
+def _filter_stopwords(tokens:list, is_lower_case:bool) -> list:
+    stopword_list = _get('stopword_list')
     if is_lower_case:
-        filtered_tokens = [token for token in tokens if token not in stopword_list]
+        return [token for token in tokens if token not in stopword_list]
     else:
-        filtered_tokens = [token for token in tokens if token.lower() not in stopword_list]
-    filtered_text = ' '.join(filtered_tokens)    
-    return filtered_text
+        return [token for token in tokens if token.lower() not in stopword_list]
 
 # Remove punctuation -- you could remove special chars instead
 # but that is a more brutal approach that loses some of the subtlety
 # that we can get it if we keep phrases for learning sentence embeddings.
 pk    = re.compile(r'[\(\)\[\]\|<>\\]', flags=re.DOTALL) # Punctuation we don't want to 'keep'
 hy    = re.compile(r'(?:-{2,}|–|—|\s-\s)', flags=re.DOTALL) # Hyphenation ('--' and '---')
+@instrumented
 def remove_punctuation(text:str, keep_phrases:bool=True):
     """
     Remove punctuation while trying to control for issues
@@ -571,24 +998,30 @@ def remove_punctuation(text:str, keep_phrases:bool=True):
 # or which aren't part of the punctuation that we're
 # keeping because they are part of phrase boundaries.
 punkts = re.compile(r'[,;:\-!?\.\/\\]',flags=re.IGNORECASE|re.DOTALL)
+spaces = re.compile(r'\s+')
+@instrumented
 def remove_short_text(doc:str, shortest_word:int=1):
     """
     We set a minimum threshold for the length of a 'word'
     or term here so that anything which has been cleaned
     almost to oblivion can be dumped at this point. 
     """
-    text = re.split('\s+',doc)
+    text = spaces.split(doc)
     return ' '.join([x for x in text if len(x)>shortest_word or punkts.match(x)])
 
 # More useful in texts where there are very short lines that are likely
 # to be headings or other types of 'non-content' (e.g. 'Contact Us')
+newlines = re.compile(r'[\r\n]+',flags=re.DOTALL|re.M)
+space    = re.compile(r'\s')
+@instrumented
 def remove_short_lines(doc:str, shortest_line:int=1):
     """
     Looks for things like footers and other 'non-content'
     that might detract from processing of the text as a whole.
     """
-    lines = re.split(r'[\r\n]+',doc,flags=re.DOTALL|re.M)
-    rv = [l for l in lines if len(re.split(r'\s',l))>shortest_line]
+    lines = newlines.split(doc)
+    rv = [l for l in lines if len(space.split(l))>shortest_line]
+    return "\n".join(rv)
 
 # Apply BS4 filtering to remove the actual HTML tags.
 # But notice below that we need to do a bit of pre-processing
@@ -596,16 +1029,104 @@ def remove_short_lines(doc:str, shortest_line:int=1):
 # the simple removely of all HTML.
 import warnings
 warnings.filterwarnings("ignore", category=UserWarning, module='bs4')
+@instrumented
 def strip_html_tags(doc:str) -> str:
     """
     Simple interface to BS4's `soup.get_text()` method. You
     might prefer to use `strip_html` since that also controls
     for the way that get_text tends to remove semantically
-    important whitespace as well!
+    important whitespace as well! Most documents don't need 
+    BS4 at all (see `_TextExtractor`), so it is only used for
+    the ones that can't be handled more quickly.
     """
-    soup = BeautifulSoup(doc, "html.parser")
+    if isinstance(doc, str):
+        if '<' not in doc and '&' not in doc:
+            return _bs4_string(doc) if doc else doc
+        try:
+            return _TextExtractor().extract(doc)
+        except (_Fallback, AssertionError):
+            pass
+    soup = _get('BeautifulSoup')(doc, "html.parser")
     return soup.get_text(separator=" ")
 
+# Building a BS4 tree for every document just so that we can ask for
+# its text is expensive. _TextExtractor uses the same parser as BS4's 
+# 'html.parser' builder but keeps only the text as it goes, following 
+# the rules that give the same result as `soup.get_text(separator=" ")`:
+# every tag (or comment) ends a string, strings that are only spaces
+# become ' ' (or '\n'), and the strings are joined with a space. If 
+# it finds anything that BS4 treats differently (e.g. the contents of
+# <script> or <pre>, CDATA, or odd character references) it gives up 
+# and strip_html_tags falls back to BS4.
+class _Fallback(Exception):
+    pass
+
+ascii_spaces = "\x20\x0a\x09\x0c\x0d" # What BS4 counts as whitespace
+def _bs4_string(text:str) -> str:
+    if text.strip(ascii_spaces):
+        return text
+    return "\n" if "\n" in text else " "
+
+html_entities = {k[:-1]: v for k, v in html.entities.html5.items() if k.endswith(';')}
+numeric_ref   = re.compile(r'(?:[0-9]+|[xX][0-9a-fA-F]+)$')
+class _TextExtractor(HTMLParser):
+    # Tags whose contents BS4 doesn't treat as ordinary text
+    special_tags = frozenset(['script','style','template','rt','rp','pre','textarea'])
+
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.strings = []
+        self.current = []
+
+    def extract(self, doc:str) -> str:
+        self.feed(doc)
+        self.close()
+        self.end_string()
+        return " ".join(self.strings)
+
+    def end_string(self):
+        if self.current:
+            self.strings.append(_bs4_string("".join(self.current)))
+            self.current = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.special_tags:
+            raise _Fallback(tag)
+        self.end_string()
+
+    def handle_endtag(self, tag):
+        self.end_string()
+
+    def handle_data(self, data):
+        self.current.append(data)
+
+    def handle_entityref(self, name):
+        self.current.append(html_entities.get(name, '&' + name))
+
+    def handle_charref(self, name):
+        if not numeric_ref.match(name):
+            raise _Fallback(name)
+        n = int(name[1:], 16) if name[0] in 'xX' else int(name)
+        # Control characters, surrogates, etc. get special treatment
+        if (n < 0x20 or 0x7f <= n < 0xa0 or 0xd800 <= n <= 0xdfff or n > 0x10ffff 
+                or 0xfdd0 <= n <= 0xfdef or (n & 0xfffe) == 0xfffe):
+            raise _Fallback(name)
+        self.current.append(chr(n))
+
+    # Comments, doctypes and processing instructions end the 
+    # current string but aren't part of the text
+    def handle_comment(self, data):
+        self.end_string()
+
+    def handle_decl(self, decl):
+        self.end_string()
+
+    def handle_pi(self, data):
+        self.end_string()
+
+    def unknown_decl(self, data):
+        raise _Fallback(data)
+
 # Remove HTML syntax but leave whatever its content was! 
 # With Beautiful Soup you need to insert whitespace 
 # otherwise retrieving the HTML loses all of the word
@@ -613,11 +1134,14 @@ def strip_html_tags(doc:str) -> str:
 #   soup.get_text(separator=" ")
 # but that may not always do what we want compared to
 # a regex.
+markup  = re.compile(r'(:?<|>)')
+end_tag = re.compile(r'(\/[A-Za-z]+\d?|[A-Za-z]+ \/)>')
+@instrumented
 def strip_html(doc:str):
-    if re.search(r'(:?<|>)',doc):
+    if markup.search(doc):
         # bs4 strips out semantically important whitespace so we need
         # to insert an extra space after end-tags.
-        doc = re.sub(r'(\/[A-Za-z]+\d?|[A-Za-z]+ \/)>','\\1> ', html.unescape(doc))
+        doc = end_tag.sub('\\1> ', html.unescape(doc))
         return strip_html_tags(doc)
     else:
         return doc
@@ -635,67 +1159,115 @@ err   = re.compile(f"(/(?:{'|'.join(entities)}))([^\.\s]+)", flags=re.DOTALL|re.
 pkerr = re.compile(r'\.{2,}\s?\_?', flags=re.DOTALL)
 # Another possible processing artefact or possible scanning output
 herr  = re.compile(r'(?:-|_)+', flags=re.DOTALL)
+@instrumented
 def fix_ner_errors(doc):
     return herr.sub('_',pkerr.sub(' . ', err.sub(r'\2\1', doc)))
 
 preamble_re = re.compile(r'^(?:[Ss]ee )?(?:for )?(?:e\.?g\.? )?;?\s*')
+parens_re   = re.compile(r'\((.+?)\)')            # Potential publications
+year_re     = re.compile(r'\d{4}(?!s)')            # 2005 but not 1990s
+authors_re  = re.compile(r'(?:,\s+&?\s*|\s+&\s+)') # Separators between authors
+words_re    = re.compile(r'(?:,&)?\s+')
+capital_re  = re.compile(r'[A-Z]')
 # Detecting likely publications -- still need to do a little work 
 # to tidy up inline citations; e.g. 'Felix Guattari (2005, 2009)' is
 # currently turning into Felix Guattari Felix_Guattari_2005/REF Felix_Guattari_2009/REF
 # so you're getting an extra Guattari there.
+#
+# We make one pass over the document: each parenthetical is replaced 
+# by the references found in it (if any) and the output is put back
+# together with a single join at the end. Replacing each parenthetical
+# in the whole document as we went (and searching back from it for 
+# the start of the sentence every time we found a year) made this 
+# very slow on long texts such as theses.
+@instrumented
 def detect_publications(d):
+    """
+    Replaces parenthetical references such as '(Smith & Jones 2005)'
+    or 'Felix Guattari (2005)' with tagged terms such as 
+    'Smith_Jones_2005/REF'. Other parentheticals are removed.
+
+    d: the text in which to look for publications
+    """
     # Convert back to string-form if is in list (tokenised) form
     if type(d) is list: 
         d = ' '.join([' '. join([str(elem) for elem in sublist]) for sublist in d])
 
-    refs = []
+    pieces   = [] # The output
+    sentence = [] # The output since the last '.' 
+    last     = 0  # The end of the previous parenthetical
 
     # These are potential publications, but could just 
     # as easily be parentheticals!
-    for m in re.finditer(r'\((.+?)\)',d):
-        
-        #print(f"=> {m.group(1)}")
-        start_pos = 1
+    for m in parens_re.finditer(d):
+        text = d[last:m.start()]
+        dot  = text.rfind('.')
+        if dot >= 0:
+            sentence = [text[dot+1:]]
+        else:
+            sentence.append(text)
+        refs = ' '.join(_publication_refs(m, sentence))
+        # The references never contain a '.' so they are 
+        # always part of the current sentence
+        sentence.append(refs)
+        pieces.extend([text, refs])
+        last = m.end()
+    pieces.append(d[last:])
+    return ''.join(pieces)
+
+def _publication_refs(m, sentence:list) -> list:
+    """
+    Returns the references found in the parenthetical `m`, where 
+    `sentence` is the text of the sentence leading up to it.
+    """
+    refs    = []
+    authors = None # Capitalised words just before the parenthetical 
+    start_pos = 1
+    
+    if DEBUG: print(f"0. {m.group(0)}")
+
+    for y in year_re.finditer(m.group(1)):
         
-        if DEBUG: print(f"0. {m.group(0)}")
-
-        for y in re.finditer(r'\d{4}(?!s)',m.group(1)):
-            
-            if DEBUG: print(f"\t1. '{y.group()}' ({y.start()}->{y.end()})")
-
-            author_txt = ""
-            for r in re.split(r'(?:,\s+&?\s*|\s+&\s+)',preamble_re.sub('',m.group()[start_pos:y.start()])):
-                if DEBUG: print(f"\t2. '{r}'")
-                if re.search('\d{4}(?!s)',r) or len(r) < 2:
-                    if DEBUG: print(f"\t3. Probably an inline author reference... '{r}'")
-                    d_rng = re.split(r'(?:,&)?\s+',d[d[:m.start()].rfind('.')+1:m.start()]) # range in 'd' where likely to find author
-                    #print(f"\t4. => {d_rng}")
-                    for i in reversed(d_rng):
-                        #print(f"\t\t- {i}")
-                        if len(i) > 0:
-                            if re.match(r'[A-Z]',i) or i in ['von','van','the']: #len(i) < 3 or 
-                                if author_txt != '':
-                                    author_txt = i + '_' + author_txt
-                                else:
-                                    author_txt = i
-                            else:
-                                break
-                elif len(r.split(' ')) > 4:
-                    pass
+        if DEBUG: print(f"\t1. '{y.group()}' ({y.start()}->{y.end()})")
+
+        author_txt = ""
+        for r in authors_re.split(preamble_re.sub('',m.group()[start_pos:y.start()])):
+            if DEBUG: print(f"\t2. '{r}'")
+            if year_re.search(r) or len(r) < 2:
+                if DEBUG: print(f"\t3. Probably an inline author reference... '{r}'")
+                if authors is None:
+                    authors = _inline_authors(''.join(sentence))
+                if authors:
+                    author_txt = '_'.join(authors + [author_txt]) if author_txt != '' else '_'.join(authors)
+            elif len(r.split(' ')) > 4:
+                pass
+            else:
+                if author_txt != '':
+                    author_txt += '_'+r
                 else:
-                    if author_txt != '':
-                        author_txt += '_'+r
-                    else:
-                        author_txt = r
-            if author_txt != "":
-                author_txt = author_txt.replace(",",'').replace(' ','_') + '_' + y.group() + "/REF"
-                if DEBUG: print(f"\t- Author txt: {author_txt}")
-                refs.append(author_txt.replace('.',''))
-            start_pos = y.end() + 1
-    
-        if m.group(0).startswith('(') and m.group(0).endswith(')'):
-            d = d.replace(m.group(0), ' '.join(refs))
-    return d
+                    author_txt = r
+        if author_txt != "":
+            author_txt = author_txt.replace(",",'').replace(' ','_') + '_' + y.group() + "/REF"
+            if DEBUG: print(f"\t- Author txt: {author_txt}")
+            refs.append(author_txt.replace('.',''))
+        start_pos = y.end() + 1
+    return refs
+
+def _inline_authors(text:str) -> list:
+    """
+    Returns the run of capitalised words (or 'von', 'van' and 'the')
+    at the end of `text` -- i.e. the likely author(s) of an inline 
+    reference such as 'Felix Guattari (2005)'.
+    """
+    authors = []
+    for i in reversed(words_re.split(text)): # range in 'd' where likely to find author
+        if len(i) > 0:
+            if capital_re.match(i) or i in ['von','van','the']: #len(i) < 3 or 
+                authors.append(i)
+            else:
+                break
+    authors.reverse()
+    return authors
 
 # This probably needs more work since it's by far the slowest 
 # part of the cleaning process. That said, it's also doing the
@@ -716,7 +1288,18 @@ def detect_publications(d):
 prefix_re = re.compile(r'^(?:the|an|a)_', re.IGNORECASE)
 suffix_re = re.compile(r'[^A-Za-z0-9]+$') # Was r'[\)_]+$'
 paren_re  = re.compile(r'\s*\([^\)]+\)?$')
+period_re = re.compile(r'(?:period)_')
+circa_re  = re.compile(r'ca?\.[\_]+')
+@instrumented
 def detect_entities(text, spacy_model):
+    """
+    Uses a spaCy model to find (multi-word) named entities and
+    replaces them with a single, tagged 'word' such that 'the 
+    World War II era' becomes 'World_War_II/EVENT era'.
+
+    text: the text in which to detect entities
+    spacy_model: a loaded spaCy model (e.g. spacy.load('en_core_web_sm'))
+    """
     # Convert back to string-form if is in list (tokenised) form
     if type(text) is list: 
         text = ' '.join([' '. join([str(elem) for elem in sublist]) for sublist in text])
@@ -730,7 +1313,49 @@ def detect_entities(text, spacy_model):
 
     toc = time.perf_counter()
     #print(f"Model created in {toc-tic:0.2f}")
+    if instruments.enabled: instruments.record('spacy_model', toc-tic, _nbytes(text))
 
+    return substitute_entities(text, entity_substitutions(doc))
+
+# The only spaCy components that have any bearing on entity
+# recognition; everything else (parser, lemmatizer, ...) is
+# switched off when we process documents in batches.
+NER_PIPES = set(['ner','entity_ruler','span_ruler','tok2vec','transformer'])
+
+def detect_entities_batch(texts, spacy_model, batch_size:int=64, n_process:int=1):
+    """
+    Does the same job as `detect_entities` but for many documents
+    at once, using spaCy's `nlp.pipe` so that documents are processed
+    in batches (and, optionally, in several processes) with only the
+    components needed for NER switched on. Documents are yielded in
+    the same order that they were given.
+
+    texts: an iterable of documents (e.g. a pandas Series)
+    spacy_model: a loaded spaCy model (e.g. spacy.load('en_core_web_sm'))
+    batch_size: the number of documents to give spaCy at a time
+    n_process: the number of processes spaCy should use
+    """
+    def as_text(text):
+        # Convert back to string-form if is in list (tokenised) form
+        if type(text) is list: 
+            return ' '.join([' '. join([str(elem) for elem in sublist]) for sublist in text])
+        return text
+
+    disable = [p for p in spacy_model.pipe_names if p not in NER_PIPES]
+    docs    = spacy_model.pipe(map(as_text, texts), batch_size=batch_size, 
+                               n_process=n_process, disable=disable)
+    for doc in docs:
+        yield substitute_entities(doc.text, entity_substitutions(doc))
+
+@instrumented
+def entity_substitutions(doc) -> dict:
+    """
+    Builds the dictionary of substitutions (original text -> 
+    tagged replacement) for the entities that spaCy found in 
+    a document.
+
+    doc: a document processed by a spaCy model
+    """
     s = dict() # Create dict of substitutions
 
     tic = time.perf_counter()
@@ -745,9 +1370,7 @@ def detect_entities(text, spacy_model):
                     stxt = ''
                 elif e.label_ in ['DATE']:
                     # Deal with 'c.1580', 'ca. 1795' and 'period_of_...' 
-                    se = re.sub(r'ca?\.[\_]+','',
-                                    re.sub(r'(?:period)_','',e.text.replace(" ","_"))
-                                )
+                    se = circa_re.sub('', period_re.sub('', e.text.replace(" ","_")))
                     # Deal with all the other things that crop up 
                     # (e.g. 'the Neolithic to the Roman period (4000 BCE - 410 CE')
                     se = suffix_re.sub('',paren_re.sub('',prefix_re.sub('', se)))
@@ -764,63 +1387,48 @@ def detect_entities(text, spacy_model):
     toc = time.perf_counter()
     #print(f"Dict of substitutions created in {toc-tic:0.2f}")
 
-    # Now make the substitutions -- I have a strong suspicion
-    # that this is very, very slow. Would it be better to have
-    # a map (k -> v) that is applied in a list context? E.g.
-    # [map(x) for x in nltk.tokenize(str)] 
-    # That would require you to store things that aren't being
-    # substituted as well (which is fine since these aren't long
-    # documents), but if you were concerned with large docs then
-    # something like:
-    # [map(x) if x in map else x for x in nltk.tokenize(str)]
+    return s
+
+@instrumented
+def substitute_entities(text:str, subs:dict) -> str:
+    """
+    Makes all of the entity substitutions in a single pass over
+    the text. Rather than building (and running) one regex per 
+    entity we build a single regex that matches *any* of them; 
+    the entities are tried longest first so that 'the Bank of 
+    England Museum' wins over 'the Bank of England'. As before,
+    we check that the NER process hasn't accidentally matched 
+    in the middle of something we already knew about (i.e. that 
+    isn't next to a '_').
+
+    text: the text in which to make the substitutions
+    subs: a dictionary of original text -> replacement text
+    """
+    # The basic assumption built into this process is
+    # that we're only really interested in words > unigrams
+    # so something like 'James' won't actually be registered
+    # as a person because it's not particularly important 
+    # that we spot this as an 'entity' compared to something
+    # like 'the Uniform Dispute Resolution Policy'. However,
+    # looking back at the name of this function perhaps it 
+    # needs a rename since you might reasonably *think* that
+    # it will give you unigram NERs as well!
+    keys = sorted((k for k in subs if ' ' in k), key=len, reverse=True)
+    if not keys:
+        return text
+
     tic = time.perf_counter()
-    for sk in s.keys():
-        # The basic assumption built into this process is
-        # that we're only really interested in words > unigrams
-        # so something like 'James' won't actually be registered
-        # as a person because it's not particularly important 
-        # that we spot this as an 'entity' compared to something
-        # like 'the Uniform Dispute Resolution Policy'. However,
-        # looking back at the name of this function perhaps it 
-        # needs a rename since you might reasonably *think* that
-        # it will give you unigram NERs as well!
-        if ' ' in sk:
-            try: 
-                # Here we build a custom regex for the substitution
-                # but notice that we need to check the NER process
-                # hasn't accidentally interpolated into the middle 
-                # of something we already knew about.
-                pat = r'\b(?<!_)' + sk + r'(?!_)\b'
-                if DEBUG: print(f"Substitution: {sk} -> {s[sk]} with {pat}")
-                rs = re.compile(pat)
-                d = rs.sub(s[sk], d)
-            except:
-                # If the pattern doesn't compile (this happens a fair
-                # few times because of special characters in the origin
-                # text) then we try to substitute out likely problem
-                # characters by replacing them with the '.' (any char)
-                # character. The only thing doesn't deal with (which 
-                # seems to crop up because of poor OCR) is the accidental
-                # escape (e.g. 'W' became '\V' during OCR of thesis).
-                err = sys.exc_info()
-                #print(f"    Exception type: {err[1]}")
-                try:
-                    # Basically try to substitute out anything that might give us trouble
-                    pat = r'\b(?<!_)' + re.sub(r'[\(\)<>{}\$\\\+\[\]:;&\?\^~]','.',sk) + r'(?!_)\b'
-                    rs = re.compile(pat)
-                    d = rs.sub(s[sk], d)
-                    if DEBUG: print(f"    Adjusted regex: " + pat)
-                except:
-                    # At this point we're dealing with a (hopefully) small number
-                    # of cases where there is weirdness like '$\sim$' that does
-                    # badly when trying to manage things via regex substitution
-                    # composed automatically
-                    print(f"    Unable to manage substitution automatically for '{sk}'")
-    
+    # Escaping the keys means that special characters in the 
+    # source text (which used to break the per-entity regexes) 
+    # are matched literally.
+    pat = re.compile(r'\b(?<!_)(?:' + '|'.join(map(re.escape, keys)) + r')(?!_)\b')
+    if DEBUG: print(f"Substitutions: {subs} with {pat.pattern}")
+    text = pat.sub(lambda m: subs[m.group(0)], text)
+
     toc = time.perf_counter()
     #print(f"Substitutions completed in {toc-tic:0.2f}")
     
-    return d
+    return text
 
 # Deal with likely acronyms -- I was trying to 
 # develop something quite sophisticated but there
@@ -857,6 +1465,8 @@ acro = re.compile(r"""\b(?<=\s)  # Look for a proper break before
 extras = re.compile(r"""\b(?<=\s)  
                         ([A-Za-z0-9_]+?)_([A-Z]{3,})(?:s|\'s)?/([A-Z]{,6})
                         (?=\b)""", flags=re.X|re.DOTALL) # \b replaces [\s\.\)\]\;\:]
+stops = re.compile(r'\.(?!\s)')
+@instrumented
 def detect_acronyms(text:str) -> str:
     """
     Detect likely acronyms and assign a (false) NER tag so that
@@ -871,11 +1481,287 @@ def detect_acronyms(text:str) -> str:
     if not text or text==None or text=='':
         return ''
     else:
-        return re.sub('\.(?!\s)', '', extras.sub(r'\1/\3 \2/ACRONYM', acro.sub(r'\1/ACRONYM', text)))
+        return stops.sub('', extras.sub(r'\1/\3 \2/ACRONYM', acro.sub(r'\1/ACRONYM', text)))
 
 multiples = re.compile(r'(?:\s*\.\s*){2,}')
+linebreaks = re.compile(r'[\r|\n|\r\n]+')
+# Replacing `linebreaks` (which also matches '|') and then `spaces` 
+# is the same as replacing runs of whitespace or '|' in one go. The 
+# quotemarks (see `remove_quotemarks`) never overlap with these and 
+# also become a space, so they can go in the same pass too. Checking 
+# for possessives is relatively expensive so we only do it if there's 
+# a '’' in the text at all.
+collapse     = re.compile(f"[\\s|]+|{quote_chars}")
+collapse_sqp = re.compile(f"[\\s|]+|{quote_chars}|{sqp.pattern}")
+@instrumented
+def collapse_chars(text:str) -> str:
+    """
+    Removes newlines, extra whitespace and quotemarks from
+    the text in a single pass.
+
+    text: the input text.
+    """
+    return (collapse_sqp if '’' in text else collapse).sub(' ', text)
+
 translate_table = dict((ord(char), None) for char in string.punctuation if char != '.')
 translate_numbers = dict((ord(char), None) for char in '1234567890') 
+@instrumented
+def strip_digits(text:str) -> str:
+    """
+    Removes all of the digits from the text.
+
+    text: the input text.
+    """
+    return text.translate(translate_numbers)
+
+@instrumented
+def tidy_punctuation(text:str) -> str:
+    """
+    Final tidy-up: collapses runs of full-stops into a single ' . '
+    and removes any remaining punctuation other than '.'.
+
+    text: the input text.
+    """
+    return multiples.sub(' . ', text).translate(translate_table)
+
+# In 'token-stream' mode the pipeline tokenises each document once
+# (when it's lemmatised) and then works on the list of tokens until 
+# the stopwords have been removed, rather than joining the tokens 
+# back together only for `remove_stopwords` to tokenise them again. 
+# These are the stages that take and return a list of tokens.
+@instrumented
+def tokenise(text:str) -> list:
+    """
+    Splits the text into tokens using the same tokenizer as 
+    `remove_stopwords` (used instead of `lemmatise_tokens` 
+    when there's no lemmatisation).
+
+    text: the text to tokenise.
+    """
+    return _get('wtok').tokenize(text)
+
+def map_tokens(func, tokens:list) -> list:
+    """
+    Applies a string function (e.g. str.lower) to every token.
+
+    func: the function to apply
+    tokens: a list of tokens
+    """
+    return [func(token) for token in tokens]
+
+@instrumented
+def remove_stopword_tokens(tokens:list, is_lower_case:bool=False) -> list:
+    """
+    The token version of `remove_stopwords`. Tokens that have
+    had spaces put in them by an earlier stage are split so 
+    that each part is checked separately.
+
+    tokens: a list of tokens
+    is_lower_case: Boolean indicating whether or not the tokens should be treated as lower-case (default: False)
+    """
+    return _filter_stopwords([t for token in tokens for t in token.split()], is_lower_case)
+
+def join_tokens(tokens:list) -> str:
+    """Joins a list of tokens back into a single string."""
+    return ' '.join(tokens)
+
+# Rather than checking a dozen flags for every document, we work out
+# which functions need to run (and with what options) once, and then
+# just run them one after another. Stages are plain functions (or 
+# partials) so that a pipeline can be pickled and sent to the workers
+# in `normalise_corpus`. Lambdas can't be pickled so don't use them!
+class TextPipeline:
+    """
+    An ordered list of 'stages' (functions that take and return
+    a string) that are applied in turn to each document:
+
+        pipe = TextPipeline([strip_html_tags, collapse_chars, 
+                             ('lower', str.lower), remove_stopwords])
+        pipe("<p>Some text</p>")
+
+    Use `TextPipeline.from_options` to get the same stages as 
+    `normalise_document`. If `timed` is True then the time spent 
+    in each stage is recorded and can be seen with `timings()`.
+    A stage doesn't have to return a string so long as the next 
+    stage knows what to do with what it gets: e.g. in token-stream 
+    mode some stages work on a list of tokens.
+
+    stages: a list of functions or (name, function) pairs
+    timed: whether to record the number of calls and time taken by each stage
+    """
+    def __init__(self, stages:list, timed:bool=False):
+        self.stages = [s if isinstance(s, tuple) else (_stage_name(s), s) for s in stages]
+        self.timed  = timed
+        self.reset()
+
+    @classmethod
+    def from_options(cls, html_stripping=True, contraction_expansion=True,
+                     accented_char_removal=True, text_lower_case=True,
+                     text_lemmatization=True, special_char_removal=False,
+                     punctuation_removal=True, keep_sentences=True,
+                     stopword_removal=True, remove_digits=False, infer_numbers=True,
+                     shortest_word=3, timed:bool=False, token_stream:bool=False):
+        """
+        Builds the pipeline used by `normalise_document` for a 
+        given set of options (see there for what they do).
+
+        If `token_stream` is True then the document is tokenised
+        once (when it's lemmatised) and the following stages up to 
+        and including stopword removal work on the list of tokens, 
+        which is then joined back together only once. This is 
+        faster but, because the tokens aren't re-tokenised by 
+        `remove_stopwords`, the output can very occasionally differ 
+        from `normalise_document`'s.
+        """
+        stages = []
+        if html_stripping:
+            stages.append(strip_html_tags)
+        stages.append(collapse_chars) # newlines, whitespace and quotemarks
+        if accented_char_removal:
+            stages.append(remove_accented_chars)
+        if contraction_expansion:
+            stages.append(expand_contractions)
+        if infer_numbers:
+            stages.append(expand_numbers)
+        if token_stream and (text_lemmatization or stopword_removal):
+            stages.append(lemmatise_tokens if text_lemmatization else tokenise)
+            if text_lower_case:
+                stages.append(('lower', partial(map_tokens, str.lower)))
+            if special_char_removal:
+                stages.append(('remove_special_chars', partial(map_tokens, partial(remove_special_chars, remove_digits=remove_digits))))
+            if remove_digits:
+                stages.append(('strip_digits', partial(map_tokens, strip_digits)))
+            if stopword_removal:
+                stages.append(('remove_stopwords', partial(remove_stopword_tokens, is_lower_case=text_lower_case)))
+            stages.append(join_tokens)
+        else:
+            if text_lemmatization:
+                stages.append(lemmatise)
+            if text_lower_case:
+                stages.append(('lower', str.lower))
+            if special_char_removal:
+                stages.append(('remove_special_chars', partial(remove_special_chars, remove_digits=remove_digits)))
+            if remove_digits:
+                stages.append(strip_digits)
+            if stopword_removal:
+                stages.append(('remove_stopwords', partial(remove_stopwords, is_lower_case=text_lower_case)))
+        # Deal with HTML entities -- not sure
+        # why these aren't picked up earlier in 
+        # the HTML function...
+        stages.append(('unescape', html.unescape))
+        if punctuation_removal:
+            stages.append(('remove_punctuation', partial(remove_punctuation, keep_phrases=keep_sentences)))
+        if shortest_word > 1:
+            stages.append(('remove_short_text', partial(remove_short_text, shortest_word=shortest_word)))
+        stages.append(tidy_punctuation)
+        return cls(stages, timed=timed)
+
+    @property
+    def names(self) -> list:
+        return [name for name, _ in self.stages]
+
+    @property
+    def fingerprint(self) -> str:
+        """
+        A description of the stages (and their options) that is 
+        used to key cached results (see `DocumentCache`).
+        """
+        return ' -> '.join(_stage_repr(func) for _, func in self.stages)
+
+    def reset(self):
+        """Zeroes the timing counters."""
+        self.calls   = [0] * len(self.stages)
+        self.seconds = [0.0] * len(self.stages)
+
+    def __call__(self, doc:str) -> str:
+        """
+        Runs each stage in turn on `doc`. As with `normalise_document`,
+        if a stage can't handle its input (e.g. NaN rather than a 
+        string) we give up and hand back whatever we had got to.
+        """
+        try:
+            if not (self.timed or DEBUG):
+                for _, func in self.stages:
+                    doc = func(doc)
+                return doc
+            for i, (name, func) in enumerate(self.stages):
+                tic = time.perf_counter()
+                doc = func(doc)
+                self.seconds[i] += time.perf_counter() - tic
+                self.calls[i]   += 1
+                if DEBUG: print(f"After {name}:\n\t{doc}")
+            return doc
+        except TypeError as err:
+            if DEBUG:
+                print(f"Problems with: {doc}")
+                print(err)
+            return doc if doc is not None else ''
+
+    def timings(self) -> 'pd.DataFrame':
+        """
+        Returns a data frame with the number of calls, total time,
+        mean time per call (in microseconds) and share of the total
+        time for each stage. Only recorded when `timed` is True.
+        """
+        import pandas as pd
+        df = pd.DataFrame({'calls': self.calls, 'seconds': self.seconds}, index=pd.Index(self.names, name='stage'))
+        df['per_call_us'] = (df.seconds / df.calls.where(df.calls > 0)) * 1e6
+        total = df.seconds.sum()
+        df['share'] = df.seconds / total if total > 0 else 0.0
+        return df
+
+    def __len__(self):
+        return len(self.stages)
+
+    def __repr__(self):
+        return f"TextPipeline({' -> '.join(self.names)})"
+
+def _stage_repr(func) -> str:
+    """
+    Describes a stage for `TextPipeline.fingerprint`. Our own stages
+    are covered by `__version__` so their name is enough, but a
+    user-supplied function is also identified by a hash of its code
+    (and defaults and closure) since two lambdas, or a function that 
+    has been redefined in a notebook, can share a name but not output.
+    """
+    if isinstance(func, partial):
+        args = [_stage_repr(a) if callable(a) else repr(a) for a in func.args]
+        args += [f"{k}={_stage_repr(v) if callable(v) else repr(v)}" for k, v in sorted(func.keywords.items())]
+        return f"{_stage_repr(func.func)}({', '.join(args)})"
+    name = getattr(func, '__qualname__', None)
+    if name is None:
+        return repr(func)
+    module = getattr(func, '__module__', None)
+    if module is None or module == __name__:
+        return name
+    code = getattr(func, '__code__', None)
+    if code is None:
+        return f"{module}.{name}"
+    h = hashlib.sha1(_code_repr(code).encode('utf-8'))
+    h.update(repr(getattr(func, '__defaults__', None)).encode('utf-8'))
+    h.update(repr(getattr(func, '__kwdefaults__', None)).encode('utf-8'))
+    for cell in getattr(func, '__closure__', None) or ():
+        try:
+            value = cell.cell_contents
+        except ValueError: # An empty cell
+            value = None
+        h.update((_stage_repr(value) if callable(value) else repr(value)).encode('utf-8'))
+    return f"{module}.{name}#{h.hexdigest()[:12]}"
+
+def _code_repr(code) -> str:
+    """The parts of a code object that determine what it does."""
+    consts = [_code_repr(c) if hasattr(c, 'co_code') else repr(c) for c in code.co_consts]
+    return repr((code.co_code, code.co_names, code.co_varnames, code.co_freevars, consts))
+
+def _stage_name(func) -> str:
+    if isinstance(func, partial):
+        func = func.func
+    return getattr(func, '__name__', repr(func))
+
+# normalise_document gets called over and over again with the same
+# options so we only build the pipeline once for each set of options.
+_pipelines = {}
+@instrumented
 def normalise_document(doc:str, html_stripping=True, contraction_expansion=True,
                      accented_char_removal=True, text_lower_case=True,
                      text_lemmatization=True, special_char_removal=False,
@@ -884,89 +1770,204 @@ def normalise_document(doc:str, html_stripping=True, contraction_expansion=True,
                      shortest_word=3) -> str:
     """
     Apply all of the functions above to a document using their
-    default values so as to demonstrate the NLP process.
+    default values so as to demonstrate the NLP process. This 
+    builds (and remembers) a `TextPipeline` for the options 
+    given, so if you want to profile or reuse the steps then use 
+    `TextPipeline.from_options` directly.
 
     doc: a document to clean.
     """
     if DEBUG: print(f"Input:\n\t{doc}")
 
-    try: 
-        # strip HTML
-        if html_stripping:
-            doc = strip_html_tags(doc)
-            if DEBUG: print(f"After HTML removal:\n\t{doc}")
-    
-        # remove extra newlines
-        doc = re.sub(r'[\r|\n|\r\n]+', ' ', doc)
-    
-        # remove extra whitespace
-        doc = re.sub('\s+', ' ', doc)
-        if DEBUG: print(f"After newline and whitespace removal:\n\t{doc}")
-        
-        # remove quotemarks
-        doc = remove_quotemarks(doc)
-        
-        # remove accented characters
-        if accented_char_removal:
-            doc = remove_accented_chars(doc)
-            if DEBUG: print(f"After accent removal:\n\t{doc}")
-    
-        # expand contractions    
-        if contraction_expansion:
-            doc = expand_contractions(doc)
-            if DEBUG: print(f"After contraction expansion:\n\t{doc}")
-    
-        # infer numbers from abbreviations
-        if infer_numbers:
-            doc = expand_numbers(doc)
-            if DEBUG: print(f"After number expansion:\n\t{doc}")
-    
-        # lemmatize text
-        if text_lemmatization:
-            doc = lemmatise(doc)
-            if DEBUG: print(f"After lemmatisation:\n\t{doc}")
-    
-        # lowercase the text    
-        if text_lower_case:
-            doc = doc.lower()
-            if DEBUG: print(f"After lower-casing:\n\t{doc}")
-        
-        # remove special characters and\or digits    
-        if special_char_removal:
-            doc = remove_special_chars(doc, remove_digits)
-            if DEBUG: print(f"After special char removal:\n\t{doc}")
-    
-        if remove_digits:
-            doc = doc.translate(translate_numbers)
+    options = (html_stripping, contraction_expansion, accented_char_removal, 
+               text_lower_case, text_lemmatization, special_char_removal, 
+               punctuation_removal, keep_sentences, stopword_removal, 
+               remove_digits, infer_numbers, shortest_word)
+    pipeline = _pipelines.get(options)
+    if pipeline is None:
+        pipeline = _pipelines[options] = TextPipeline.from_options(*options)
+    return pipeline(doc)
+
+# Most documents don't change from one scrape to the next so, rather
+# than cleaning them all over again, we can keep the results on disk.
+# Results are keyed on a hash of the module version, the stages of the
+# pipeline (and their options) and the document itself, so changing 
+# any of these means that the document is cleaned again. Note that 
+# changes to mappings like CONTRACTION_MAP aren't part of the key: 
+# call `clear()` if you change them. The default location and size 
+# limit can be set with FSDS_CACHE_DIR and FSDS_DOC_CACHE_LIMIT.
+DOC_CACHE_DIR   = os.environ.get('FSDS_CACHE_DIR', 
+                                 os.path.join(os.path.expanduser('~'), '.cache', 'fsds'))
+DOC_CACHE_LIMIT = int(os.environ.get('FSDS_DOC_CACHE_LIMIT', 1024**3))
+class DocumentCache:
+    """
+    An on-disk (SQLite) cache of normalised documents with a size
+    limit: once it's reached the least-recently used documents are
+    removed. Use it with `normalise_corpus`:
 
-        # remove stopwords
-        if stopword_removal:
-            doc = remove_stopwords(doc, is_lower_case=text_lower_case)
-            if DEBUG: print(f"After stopword removal:\n\t{doc}")
-        
-        # Deal with HTML entities -- not sure
-        # why these aren't picked up earlier in 
-        # the HTML function...
-        doc = html.unescape(doc)
-        
-        # remove punctuation
-        if punctuation_removal:
-            doc = remove_punctuation(doc, keep_sentences)
-            if DEBUG: print(f"After punctuation removal:\n\t{doc}")
-        
-        # remove short words
-        if shortest_word > 1:
-            doc = remove_short_text(doc, shortest_word)
-            if DEBUG: print(f"After short text removal:\n\t{doc}")
-        
-        # Tidy up
-        doc = multiples.sub(' . ', doc).translate(translate_table)
+        cache = DocumentCache()
+        df['clean'] = normalise_corpus(df.description, cache=cache)
 
-        return doc
-    except TypeError as err:
-        if DEBUG:
-            print(f"Problems with: {doc}")
-            print(err)
-            #traceback.print_exc(file=sys.stdout)
-        rval = doc if doc is not None else ''
-        return rval
\ No newline at end of file
+    path: the SQLite database (default: 'textual.sqlite' in DOC_CACHE_DIR)
+    max_bytes: the maximum total size of the cached documents
+    """
+    def __init__(self, path:str=None, max_bytes:int=DOC_CACHE_LIMIT):
+        if path is None:
+            os.makedirs(DOC_CACHE_DIR, exist_ok=True)
+            path = os.path.join(DOC_CACHE_DIR, 'textual.sqlite')
+        self.path      = path
+        self.max_bytes = max_bytes
+        self.hits      = 0
+        self.misses    = 0
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS docs (key TEXT PRIMARY KEY, value TEXT, size INTEGER, used REAL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS docs_used ON docs (used)")
+        self._db.commit()
+        self._size = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM docs").fetchone()[0]
+
+    @staticmethod
+    def key(text:str, fingerprint:str) -> str:
+        """Returns the key for `text` cleaned by a pipeline with this fingerprint."""
+        h = hashlib.sha256()
+        for part in (__version__, fingerprint, text):
+            h.update(part.encode('utf-8', 'surrogatepass'))
+            h.update(b'\0')
+        return h.hexdigest()
+
+    def get_many(self, keys) -> dict:
+        """Returns {key: cleaned document} for the keys that are in the cache."""
+        keys, found, now = list(keys), {}, time.time()
+        for i in range(0, len(keys), 500): # SQLite limits the number of parameters
+            batch = keys[i:i+500]
+            marks = ','.join('?' * len(batch))
+            found.update(self._db.execute(f"SELECT key, value FROM docs WHERE key IN ({marks})", batch))
+            self._db.execute(f"UPDATE docs SET used=? WHERE key IN ({marks})", [now] + batch)
+        self._db.commit()
+        self.hits   += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items:dict):
+        """Adds {key: cleaned document} to the cache, evicting old documents if necessary."""
+        now  = time.time()
+        rows = [(k, v, len(v.encode('utf-8', 'surrogatepass')), now) for k, v in items.items()]
+        self._db.executemany("INSERT OR REPLACE INTO docs VALUES (?, ?, ?, ?)", rows)
+        self._size = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM docs").fetchone()[0]
+        if self._size > self.max_bytes:
+            self._evict()
+        self._db.commit()
+
+    def _evict(self):
+        # Remove the least-recently used documents until we're 
+        # comfortably under the limit so we don't do this every time
+        target = self.max_bytes * 0.9
+        while self._size > target:
+            rows = self._db.execute("SELECT key, size FROM docs ORDER BY used LIMIT 1000").fetchall()
+            if not rows:
+                break
+            drop = []
+            for key, size in rows:
+                if self._size <= target:
+                    break
+                drop.append((key,))
+                self._size -= size
+            self._db.executemany("DELETE FROM docs WHERE key=?", drop)
+
+    def stats(self) -> dict:
+        """Returns the hits, misses, hit rate, number and size of the cached documents."""
+        total = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 
+                'hit_rate': self.hits / total if total > 0 else 0.0,
+                'size': len(self), 'bytes': self._size, 'max_bytes': self.max_bytes}
+
+    def clear(self):
+        self._db.execute("DELETE FROM docs")
+        self._db.commit()
+        self._size = 0
+        self.hits = self.misses = 0
+
+    def close(self):
+        self._db.close()
+
+    def __len__(self):
+        return self._db.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+def _cached_normalise_iter(docs, cache:DocumentCache, n_jobs:int, chunksize:int, pipeline=None, **kwargs):
+    """
+    Generator behind `normalise_corpus` when there's a cache: only
+    the documents that aren't in the cache are cleaned (in order) and 
+    they're added to the cache once everything has been handed back.
+    """
+    fingerprint = (pipeline or TextPipeline.from_options(**kwargs)).fingerprint
+    docs  = list(docs)
+    keys  = [cache.key(d, fingerprint) if isinstance(d, str) else None for d in docs]
+    found = cache.get_many(set(k for k in keys if k is not None))
+    todo  = [d for d, k in zip(docs, keys) if k not in found]
+    cleaned = _normalise_iter(todo, n_jobs, chunksize, pipeline, **kwargs)
+    new = {}
+    try:
+        for k in keys:
+            if k in found:
+                yield found[k]
+            else:
+                doc = next(cleaned)
+                if k is not None:
+                    new[k] = doc
+                yield doc
+    finally:
+        if new:
+            cache.put_many(new)
+
+# Each worker process runs this once when it starts so that
+# the NLTK resources are loaded once per worker and not once
+# per document (or, worse, once per chunk).
+def _init_worker():
+    warmup(*[n for n in _loaders if n not in ('pd', 'nltk', 'stopwords')], verbose=False)
+
+def _normalise_iter(docs, n_jobs:int, chunksize:int, pipeline=None, **kwargs):
+    """
+    Generator behind `normalise_corpus` -- the pool stays open
+    for as long as results are still being consumed.
+    """
+    work = pipeline if pipeline is not None else partial(normalise_document, **kwargs)
+    if n_jobs == 1:
+        yield from map(work, docs)
+        return
+    with mp.Pool(processes=n_jobs, initializer=_init_worker) as pool:
+        yield from pool.imap(work, docs, chunksize=chunksize)
+
+def normalise_corpus(docs, n_jobs:int=1, chunksize:int=64, pipeline:TextPipeline=None, 
+                     cache:DocumentCache=None, **kwargs):
+    """
+    Applies `normalise_document` to every document in a corpus,
+    optionally spreading the work across several processes. Results 
+    come back in the same order as the input and are handed back as
+    soon as they are ready, so you can start working with them 
+    before the whole corpus has been processed.
+
+    Using several processes is opt-in (set `n_jobs`) since starting
+    them is slow and, on macOS and Windows, everything handed to them 
+    (e.g. the stages of a `pipeline`) has to be picklable, so lambdas
+    and functions defined in a notebook won't work.
+
+    docs: an iterable of documents (e.g. a list or a pandas Series)
+    n_jobs: the number of processes to use (default: 1, which means don't use a pool; -1 means one per CPU)
+    chunksize: the number of documents to send to a worker at a time
+    pipeline: a `TextPipeline` to use instead of `normalise_document` (each 
+              worker gets its own copy, so timings are only kept when n_jobs=1)
+    cache: a `DocumentCache` so that only new or changed documents are cleaned
+    kwargs: any options to pass on to `normalise_document` (e.g. remove_digits=True)
+
+    Returns a pandas Series (with the same index) if `docs` was a 
+    Series, otherwise a generator of normalised documents.
+    """
+    n_jobs = (os.cpu_count() or 1) if n_jobs == -1 else max(n_jobs or 1, 1)
+    if cache is not None:
+        results = _cached_normalise_iter(docs, cache, n_jobs, chunksize, pipeline, **kwargs)
+    else:
+        results = _normalise_iter(docs, n_jobs, chunksize, pipeline, **kwargs)
+    pd = sys.modules.get('pandas') # If it's not loaded then docs can't be a Series!
+    if pd is not None and isinstance(docs, pd.Series):
+        return pd.Series(list(results), index=docs.index, name=docs.name)
+    return results
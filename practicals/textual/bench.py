@@ -0,0 +1,221 @@
+"""
+Micro-benchmarks for the textual module. Run them from the
+practicals directory with:
+
+    python -m textual.bench [listings.csv.gz] [--column description] [--docs 2000]
+
+If you don't give a listings file then a small built-in sample of
+listing-style descriptions is used instead, but the numbers are more
+meaningful on the real thing (e.g. Inside Airbnb's listings.csv.gz).
+"""
+import re
+import sys
+import html
+import time
+import argparse
+import textual
+
+# A few (made-up) descriptions in the style of the Inside Airbnb data
+SAMPLE = [
+    "<b>Welcome to our beautiful flat!</b><br />It's a 2-bedroom apartment in Hackney &amp; we've "
+    "hosted over 1.5k guests. You'll love the café around the corner -- really!",
+    "Bright double room in a friendly house share. The tube is 5 mins away and you're 20 minutes "
+    "from Oxford Street. We can't accept pets, sorry. Prices from 45k per year for long stays.",
+    "“Stunning” penthouse with views over the Thames. I'm happy to help with anything you'd need "
+    "during your stay; there's a Waitrose nearby and it's quiet at night.<br /><br />No parties.",
+    "Cosy studio (sleeps 2) — ideal for couples. Check-in after 3pm; check-out by 11am. "
+    "Don't forget to leave the keys in the lockbox [code sent on arrival].",
+]
+
+def load_corpus(path:str=None, column:str='description', n:int=2000) -> list:
+    """
+    Returns up to `n` non-empty documents from `column` of a CSV file
+    (or repeats of the built-in sample if no file is given).
+    """
+    if path is None:
+        return (SAMPLE * (n // len(SAMPLE) + 1))[:n]
+    import pandas as pd
+    docs = pd.read_csv(path, usecols=[column], low_memory=False)[column].dropna()
+    return docs.head(n).tolist()
+
+def per_doc(func, docs:list, repeat:int=5) -> float:
+    """
+    Returns the best (over `repeat` runs) time taken per document in
+    microseconds, which is a more stable measure than the average.
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        tic = time.perf_counter()
+        for d in docs:
+            func(d)
+        best = min(best, time.perf_counter() - tic)
+    return best / len(docs) * 1e6
+
+# How expand_contractions and expand_numbers used to work: the regex
+# was rebuilt from the mapping (and looked up in, or added to, `re`'s
+# own cache) on every call. These are kept here for comparison only.
+def _rebuild_expand_contractions(text, contraction_mapping=textual.CONTRACTION_MAP):
+    contractions_pattern = re.compile('({})'.format('|'.join(contraction_mapping.keys())),
+                                      flags=re.IGNORECASE|re.DOTALL)
+    def expand_match(contraction):
+        match = contraction.group(0)
+        first_char = match[0]
+        expanded_contraction = contraction_mapping.get(match) if contraction_mapping.get(match) else contraction_mapping.get(match.lower())
+        expanded_contraction = first_char+expanded_contraction[1:]
+        return expanded_contraction
+    return contractions_pattern.sub(expand_match, text)
+
+def _rebuild_expand_numbers(text, number_mapping=textual.NUMBER_MAP):
+    number_pattern = re.compile(r'([0-9]+(\.[0-9]+)?)\s?({})(?=\.|\s)'.format('|'.join(number_mapping.keys())),
+                                      flags=re.IGNORECASE|re.DOTALL)
+    def expand_number_match(number):
+        num    = float(number.group(1).replace('..','.'))
+        suffix = number.group(len(number.groups()))
+        exp = number_mapping.get(suffix)  if number_mapping.get(suffix)  else number_mapping.get(suffix.lower())
+        return str(int(num * exp))
+    return number_pattern.sub(expand_number_match, textual.formatted_nums.sub(r'\1',text))
+
+def _rebuild_remove_short_text(doc, shortest_word=3):
+    text = re.split(r'\s+',doc)
+    return ' '.join([x for x in text if len(x)>shortest_word or textual.punkts.match(x)])
+
+# strip_html_tags used to build a BS4 tree for every document
+def _bs4_strip_html_tags(doc):
+    return textual.BeautifulSoup(doc, "html.parser").get_text(separator=" ")
+
+# The character-level clean-up in normalise_document used to be done
+# as a series of separate passes over the whole document.
+def _separate_passes(doc, keep_phrases=True):
+    doc = textual.linebreaks.sub(' ', doc)
+    doc = textual.spaces.sub(' ', doc)
+    doc = textual.sq.sub(' ', textual.sqp.sub("'", doc))
+    doc = html.unescape(doc)
+    return textual.pk.sub(' . ' if keep_phrases else ' ', textual.hy.sub(', ', doc))
+
+def _fused_passes(doc, keep_phrases=True):
+    doc = textual.collapse_chars(doc)
+    doc = html.unescape(doc)
+    return textual.remove_punctuation(doc, keep_phrases)
+
+# A (made-up) paragraph in the style of a thesis or dissertation, 
+# with the sorts of references that detect_publications looks for.
+THESIS_PARAGRAPH = (
+    "The spatial turn in the humanities has been widely discussed (see e.g. Warf & Arias, 2009; "
+    "Bodenhamer, Corrigan & Harris 2010). As Felix Guattari (2005, 2009) argues, the production "
+    "of subjectivity cannot be separated from the production of space. Later work (Massey 2005) "
+    "extended this to the relational geographies of the city, while the digital humanities "
+    "(Gregory and Geddes, 2014) have brought new methods to bear on older questions. This chapter "
+    "(which draws on archival material from the 1890s) returns to these debates. "
+)
+
+# How detect_publications used to work, kept here for comparison only.
+def _quadratic_detect_publications(d):
+    refs = []
+    for m in re.finditer(r'\((.+?)\)',d):
+        start_pos = 1
+        for y in re.finditer(r'\d{4}(?!s)',m.group(1)):
+            author_txt = ""
+            for r in re.split(r'(?:,\s+&?\s*|\s+&\s+)',textual.preamble_re.sub('',m.group()[start_pos:y.start()])):
+                if re.search('\d{4}(?!s)',r) or len(r) < 2:
+                    d_rng = re.split(r'(?:,&)?\s+',d[d[:m.start()].rfind('.')+1:m.start()])
+                    for i in reversed(d_rng):
+                        if len(i) > 0:
+                            if re.match(r'[A-Z]',i) or i in ['von','van','the']:
+                                if author_txt != '':
+                                    author_txt = i + '_' + author_txt
+                                else:
+                                    author_txt = i
+                            else:
+                                break
+                elif len(r.split(' ')) > 4:
+                    pass
+                else:
+                    if author_txt != '':
+                        author_txt += '_'+r
+                    else:
+                        author_txt = r
+            if author_txt != "":
+                author_txt = author_txt.replace(",",'').replace(' ','_') + '_' + y.group() + "/REF"
+                refs.append(author_txt.replace('.',''))
+            start_pos = y.end() + 1
+        if m.group(0).startswith('(') and m.group(0).endswith(')'):
+            d = d.replace(m.group(0), ' '.join(refs))
+    return d
+
+def bench_publications(sizes:list=(10, 40, 160, 640), repeat:int=3) -> dict:
+    """
+    Times detect_publications on 'thesis-length' documents made up
+    of `sizes` paragraphs. Returns {paragraphs: (kb, before, after)}
+    with the times in milliseconds per document. If the time taken
+    grows linearly then before/after per KB should stay constant.
+    """
+    results = {}
+    for n in sizes:
+        doc = THESIS_PARAGRAPH * n
+        results[n] = (len(doc) / 1024, 
+                      per_doc(_quadratic_detect_publications, [doc], repeat) / 1e3, 
+                      per_doc(textual.detect_publications, [doc], repeat) / 1e3)
+    return results
+
+def bench_patterns(docs:list) -> dict:
+    """
+    Compares the per-document cost of rebuilding regexes on each call
+    (with a flat alternation of keys) with using the compiled pattern 
+    registry. Returns {name: (before, after)} in µs per document.
+    """
+    cases = [
+        ('expand_contractions', _rebuild_expand_contractions, textual.expand_contractions),
+        ('expand_numbers',      _rebuild_expand_numbers,      textual.expand_numbers),
+        ('remove_short_text',   _rebuild_remove_short_text,   lambda d: textual.remove_short_text(d, 3)),
+        ('character clean-up',  _separate_passes,             _fused_passes),
+        ('strip_html_tags',     _bs4_strip_html_tags,         textual.strip_html_tags),
+    ]
+    results = {}
+    for name, before, after in cases:
+        assert all(before(d) == after(d) for d in docs[:100]), f"{name} output has changed!"
+        results[name] = (per_doc(before, docs), per_doc(after, docs))
+    return results
+
+def bench_vec(docs:list, rows:int=200_000) -> dict:
+    """
+    Compares cleaning a `rows`-long Series (made up of repeats of
+    `docs`) one row at a time using `map` with the Series versions
+    in textual.vec. Returns {name: (before, after)} in ms per 1,000 rows.
+    """
+    import pandas as pd
+    from textual import vec
+    series = pd.Series((docs * (rows // len(docs) + 1))[:rows])
+    results = {}
+    for name in ['remove_quotemarks', 'remove_possessives', 'remove_punctuation',
+                 'remove_special_chars', 'expand_numbers', 'fix_ner_errors']:
+        before, after = getattr(textual, name), getattr(vec, name)
+        assert series.map(before).equals(after(series)), f"{name} output has changed!"
+        results[name] = (per_doc(lambda s: s.map(before), [series], 3) / rows,
+                         per_doc(after, [series], 3) / rows)
+    return results
+
+def main(argv:list=None):
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for the textual module")
+    parser.add_argument('path', nargs='?', help='CSV file with a column of documents')
+    parser.add_argument('--column', default='description', help='Column holding the documents')
+    parser.add_argument('--docs', type=int, default=2000, help='Number of documents to use')
+    args = parser.parse_args(argv)
+
+    docs = load_corpus(args.path, args.column, args.docs)
+    print(f"Benchmarking with {len(docs):,} documents (µs per document, best of 5)")
+    print(f"{'function':<22} {'before':>10} {'after':>10} {'speed-up':>10}")
+    for name, (before, after) in bench_patterns(docs).items():
+        print(f"{name:<22} {before:>10.2f} {after:>10.2f} {before/after:>9.1f}x")
+
+    print(f"\ndetect_publications on thesis-length documents (ms per document)")
+    print(f"{'paragraphs':>10} {'KB':>8} {'before':>10} {'after':>10} {'before/KB':>10} {'after/KB':>10}")
+    for n, (kb, before, after) in bench_publications().items():
+        print(f"{n:>10} {kb:>8.1f} {before:>10.2f} {after:>10.2f} {before/kb:>10.3f} {after/kb:>10.3f}")
+
+    print(f"\nSeries.map compared to textual.vec (ms per 1,000 rows)")
+    print(f"{'function':<22} {'map':>10} {'vec':>10} {'speed-up':>10}")
+    for name, (before, after) in bench_vec(docs).items():
+        print(f"{name:<22} {before:>10.2f} {after:>10.2f} {before/after:>9.1f}x")
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
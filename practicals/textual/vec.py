@@ -0,0 +1,201 @@
+"""
+Series-level versions of the simpler, regex-only cleaning functions
+in textual. They take (and return) a pandas Series of strings so that
+a million-row column can be cleaned without a Python call per row:
+
+    from textual import vec
+    df['description'] = vec.remove_punctuation(df.description)
+
+Where pyarrow is installed the patterns are run by Arrow's RE2-based
+string kernels (pyarrow.compute.replace_substring_regex). RE2 isn't
+quite the same as Python's `re` (no look-aheads, and \\w, \\b and
+case-insensitive matching only work for ASCII) so each function is
+written to give *exactly* the same output as its textual equivalent:
+the (usually few) rows where the two could disagree are passed to the
+textual function instead. Missing values are left as they are.
+"""
+import re
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:
+    pa = None
+
+import textual
+
+# Python's `\s` matches any Unicode whitespace but RE2's is ASCII-only,
+# so we spell out Python's version as a character class. There is no
+# whitespace after U+3000 (IDEOGRAPHIC SPACE) so we needn't check the
+# whole of Unicode.
+whitespace = ''.join(f"\\x{{{ord(c):x}}}" for c in map(chr, range(0x3001)) if c.isspace())
+
+def _re2(pattern:re.Pattern) -> str:
+    """
+    Rewrites a compiled Python regex for RE2 (swapping `\\s` for an
+    explicit whitespace class and carrying over the flags). Anything
+    else that RE2 doesn't support will be rejected by Arrow.
+
+    pattern: the compiled Python regex
+    """
+    out, in_class, chars = [], False, iter(pattern.pattern)
+    for c in chars:
+        if c == '\\':
+            c += next(chars)
+            if c == r'\s':
+                c = whitespace if in_class else f"[{whitespace}]"
+        elif c == '[':
+            in_class = True
+        elif c == ']':
+            in_class = False
+        out.append(c)
+    flags = ('i' if pattern.flags & re.IGNORECASE else '') + ('s' if pattern.flags & re.DOTALL else '')
+    return (f"(?{flags})" if flags else '') + ''.join(out)
+
+def _to_arrow(series:pd.Series):
+    """
+    Returns the Series as an Arrow string array, or None if pyarrow
+    isn't available or the Series holds something other than strings.
+    """
+    if pa is None:
+        return None
+    try:
+        return pa.array(series, type=pa.large_string(), from_pandas=True)
+    except (pa.ArrowException, TypeError, UnicodeEncodeError):
+        return None
+
+def _vectorise(series:pd.Series, func, steps:list=(), route:str=None) -> pd.Series:
+    """
+    Applies a list of regex substitutions to every string in a Series
+    using Arrow, then re-does the rows that RE2 can't be trusted with
+    using `func` (the textual function that we're replacing).
+
+    series: the Series of strings to clean
+    func: function that does the same job for a single string
+    steps: list of (compiled pattern, replacement) tuples to apply in turn
+    route: RE2 pattern matching the rows that must be passed to `func` instead
+    """
+    values = _to_arrow(series)
+    if values is None:
+        return series.map(func, na_action='ignore')
+
+    out = values
+    for pattern, replacement in steps:
+        out = pc.replace_substring_regex(out, pattern=_re2(pattern), replacement=replacement)
+
+    if route is not None:
+        mask = pc.fill_null(pc.match_substring_regex(values, pattern=route), False)
+        rows = np.flatnonzero(mask.to_numpy(zero_copy_only=False))
+        if len(rows) > 0:
+            # Only the routed rows are turned into Python strings
+            redone = [func(t) for t in values.take(rows).to_pylist()]
+            if isinstance(mask, pa.ChunkedArray):
+                mask = mask.combine_chunks()
+            out = pc.replace_with_mask(out, mask, pa.array(redone, type=out.type))
+
+    # pandas' string dtypes can be made straight from the Arrow array
+    # without a round trip through Python strings
+    if isinstance(series.dtype, pd.StringDtype):
+        return pd.Series(pd.array(out, dtype=series.dtype), index=series.index, name=series.name)
+
+    out = np.array(out.to_numpy(zero_copy_only=False), dtype=object)
+    result = pd.Series(out, index=series.index, name=series.name, dtype=object)
+    if series.dtype == object:
+        # Keep whichever missing value (None or NaN) was there before
+        return result.where(series.notna(), series)
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # The cleaned values won't all be among the old categories
+        return result.astype('category')
+    return result.astype(series.dtype)
+
+def remove_quotemarks(series:pd.Series) -> pd.Series:
+    """
+    Series version of textual.remove_quotemarks.
+
+    series: the Series of strings from which to remove quotes
+    """
+    # `\w` is ASCII-only in RE2 so the rows where it could matter
+    # (the ones with a ’ in them) are done in Python.
+    return _vectorise(series, textual.remove_quotemarks, [(textual.quotes, ' ')], route='’')
+
+# RE2 has no look-ahead so the character after the possessive is
+# captured and put back. That stops it from starting a match of its
+# own, which only matters if it's the "'" of another possessive
+# (e.g. "'s's "), so those rows are routed to Python. (Python's
+# case-insensitive 's' also matches 'ſ', the long s.)
+possessives = re.compile(r"'[sSſ]([\s',;:])")
+
+def remove_possessives(series:pd.Series) -> pd.Series:
+    """
+    Series version of textual.remove_possessives.
+
+    series: the Series of strings from which to remove possessives
+    """
+    return _vectorise(series, textual.remove_possessives, [(possessives, r' \1')], route="'[sSſ]'[sSſ]")
+
+def remove_punctuation(series:pd.Series, keep_phrases:bool=True) -> pd.Series:
+    """
+    Series version of textual.remove_punctuation.
+
+    series: the Series of strings from which to strip punctuation
+    keep_phrases: Boolean indicating whether to replace punctuation with ' . ' or ' '
+    """
+    return _vectorise(series, lambda t: textual.remove_punctuation(t, keep_phrases),
+                      [(textual.hy, ', '), (textual.pk, ' . ' if keep_phrases else ' ')])
+
+def remove_special_chars(series:pd.Series, remove_digits:bool=False, replace_with_spaces:bool=True) -> pd.Series:
+    """
+    Series version of textual.remove_special_chars.
+
+    series: the Series of strings from which to remove special characters
+    remove_digits: boolean determining whether or not to remove digits (default: False)
+    replace_with_spaces: boolean determining whether or not substitution is ' ' or '' (default: True)
+    """
+    pattern = textual.special_chars if not remove_digits else textual.special_chars_digits
+    return _vectorise(series, lambda t: textual.remove_special_chars(t, remove_digits, replace_with_spaces),
+                      [(pattern, ' ' if replace_with_spaces else '')])
+
+# textual.formatted_nums without the look-ahead: the three digits
+# after the comma are captured and put back. Because they're used up,
+# a second separator straight after them (as in '1,234,567') is
+# missed, so rows with a run of them are routed to Python.
+formatted_nums = re.compile(r'([0-9])\s?,\s?([0-9]{3})')
+separators = f"[0-9][{whitespace}]?,[{whitespace}]?[0-9]{{3}}[{whitespace}]?,[{whitespace}]?[0-9]{{3}}"
+
+def expand_numbers(series:pd.Series, number_mapping=textual.NUMBER_MAP) -> pd.Series:
+    """
+    Series version of textual.expand_numbers.
+
+    series: the Series of strings in which to expand numbers
+    number_mapping: defaults to mapping provided in textual but can be specified.
+    """
+    # The expansion (e.g. '12.5k' -> '12500') needs arithmetic so
+    # can't be done by a regex alone, but only rows with a number
+    # followed by one of the suffixes need to be done in Python. 
+    # RE2's case-insensitive 'k' matches the Kelvin sign as Python's
+    # does. Keys that aren't plain words could be any regex at all 
+    # so then every row with a digit in it goes to Python.
+    if all(re.fullmatch(r'\w+', k, flags=re.ASCII) for k in number_mapping):
+        suffixes = f"[0-9][{whitespace}]?(?i:{'|'.join(number_mapping)})[.{whitespace}]"
+    else:
+        suffixes = '[0-9]'
+    # Python's `\d` also matches non-ASCII digits, which only matter
+    # either side of a separator.
+    digits = f"[^\\x00-\\x7f][{whitespace}]?,|,[{whitespace}]?[0-9]{{0,2}}[^\\x00-\\x7f]"
+    return _vectorise(series, lambda t: textual.expand_numbers(t, number_mapping),
+                      [(formatted_nums, r'\1\2')], route='|'.join([suffixes, separators, digits]))
+
+def fix_ner_errors(series:pd.Series) -> pd.Series:
+    """
+    Series version of textual.fix_ner_errors.
+
+    series: the Series of strings in which to fix NER artefacts
+    """
+    # Python and RE2 only disagree about which non-ASCII characters
+    # match an ASCII letter when ignoring case for these four (e.g.
+    # 'K' is the Kelvin sign) so rows containing them go to Python.
+    return _vectorise(series, textual.fix_ner_errors,
+                      [(textual.err, r'\2\1'), (textual.pkerr, ' . '), (textual.herr, '_')],
+                      route='[İıſK]')